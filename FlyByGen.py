@@ -28,6 +28,7 @@ This includes:
 
 """
 
+import argparse
 import json
 import sys
 import os
@@ -41,7 +42,6 @@ from src.utils.setup import SetUp
 # import signal
 # import psutil
 
-# FEATURE: Enable multithreading and locking of json files while scene is generated
 class FlyByGen:
 
 
@@ -139,18 +139,23 @@ class FlyByGen:
     #                 pass
 
 
-    def run_graphics_module(self, cmd, config_path = None):
+    def run_graphics_module(self, cmd, config_path = None, shard = (0, 1)):
 
         # FEATURE: run combinations of multiple config file data contents
         if not config_path == None:
             logging.info(f"Received config_path_list")
             config_data = JsonParameterUpdater(config_path[0], config_path[1], config_path[2], self.FlyGenLogger)
-            adjustment_data, target_data = config_data.create_parameter_combinations()
-            config_data.run_parameter_combinations(adjustment_data, target_data, cmd)
+            adjustment_data, target_data = config_data.create_parameter_combinations(shard)
+            parallel_jobs = self.paths.get("parallel_jobs", 1)
+            config_data.run_parameter_combinations(adjustment_data, target_data, cmd, parallel_jobs)
         # Set config
 
 
-    def __init__(self):
+    def __init__(self, shard = (0, 1)):
+        """
+        :param shard: Zero based index of the shard and number of shards. Only the combinations of the shard are rendered.
+        :type shard: tuple[int]
+        """
         self.FlyGenLogger = self.logging_setup()
         # BUG: Subprocesses don't terminate in Linux
         main_setup = SetUp()
@@ -162,7 +167,7 @@ class FlyByGen:
         # Run Graphics Module
         config_path = ["src/config/blender/nucleus.json", "src/config/blender/nucleus_parameter_ranges.json", "src/config/blender/nucleus_increments.json"]
         blender_command = self.set_blender_paths()
-        self.run_graphics_module(blender_command, config_path)
+        self.run_graphics_module(blender_command, config_path, shard)
         blender_time = time.time()
         # Running python post processing
         post_process_command = self.set_post_processing_path()
@@ -177,9 +182,31 @@ class FlyByGen:
         logging.info("Finished everything")
 
 
+def parse_shard(shard):
+    """
+    Parses the shard argument of the form k/N, where k is the one based shard index and N the number of shards.
+
+    :return: Zero based index of the shard and number of shards
+
+    :rtype: tuple[int]
+    """
+    try:
+        shard_index, shard_count = (int(value) for value in shard.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Shard must be given as k/N, got {shard}")
+    if not 1 <= shard_index <= shard_count:
+        raise argparse.ArgumentTypeError(f"Shard index must be between 1 and {shard_count}, got {shard_index}")
+    return shard_index - 1, shard_count
+
+
+parser = argparse.ArgumentParser(description="Generate fly by datasets")
+parser.add_argument("--shard", type=parse_shard, default=(0, 1),
+                    help="Render only shard k of N disjoint shards of the parameter combinations, e.g. 2/4")
+args, _ = parser.parse_known_args()
+
 # print("Starting FlyByGen!")
 FlyByGen.init_for_os(FlyByGen)
 
 from src.utils.OutputLogger import OutputLogger
 from src.utils.JsonParameterHandler import JsonParameterUpdater
-FlyByGen()
+FlyByGen(args.shard)
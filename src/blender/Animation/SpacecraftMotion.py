@@ -2,9 +2,10 @@ import bpy
 import numpy as np
 import sys
 import json
+import os
 import logging
 import math
-with open('src/config/paths.json', 'r') as f:
+with open(os.environ.get('FLYBYGEN_PATHS', 'src/config/paths.json'), 'r') as f:
     paths = json.load(f)
 
 sys.path.append(paths['project_directory'])
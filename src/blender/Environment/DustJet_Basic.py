@@ -1,8 +1,9 @@
 import bpy
 import sys
 import json
+import os
 import logging
-with open('src/config/paths.json', 'r') as f:
+with open(os.environ.get('FLYBYGEN_PATHS', 'src/config/paths.json'), 'r') as f:
    paths = json.load(f)
 
 sys.path.append(paths['project_directory'])
@@ -1,14 +1,18 @@
-from mathutils import Vector, noise, Matrix
+from mathutils import Matrix
 from math import radians
 import bmesh
 import bpy
 import sys
 import json
+import os
 import logging
-with open('src/config/paths.json', 'r') as f:
+import numpy as np
+with open(os.environ.get('FLYBYGEN_PATHS', 'src/config/paths.json'), 'r') as f:
     paths = json.load(f)
 
 sys.path.append(paths['project_directory'])
+from src.utils.GeometryCache import GeometryCache
+from src.utils.NucleusShapeEngine import NucleusShapeEngine, core_seed, mesh_arrays
 
 
 # FEATURE: Check how the cores overlap and test if reasonable
@@ -31,13 +35,33 @@ class NucleusGenerator:
         noise verticles after merge smaller 0.5
         noise displacing one: strenght below 0.7 and size smaller than 2
         Noise displacement two: strenght below 0.3 and size below 0.7
+        The final meshes are cached, so a nucleus with the same cores, merges and seeds is loaded instead of generated again.
+        With "engine": "numpy" in the json file the meshes are generated by the :class:`NucleusShapeEngine` without Blender operators
+        and only imported into Blender.
         """
         
         # Load data from JSON file
         with open(paths["nucleus_config"]) as json_file:
             core_config = json.load(json_file)
+
+        geometry_cache, cache_key = self.get_geometry_cache(core_config)
+        if geometry_cache is not None:
+            meshes = geometry_cache.load(cache_key)
+            if meshes is not None:
+                self.load_cores(meshes)
+                return
+
+        if core_config.get("engine", "blender") == "numpy":
+            meshes = {core_name: mesh_arrays(vertices, faces)
+                      for core_name, (vertices, faces) in NucleusShapeEngine(core_config).generate().items()}
+            self.load_cores(meshes)
+            if geometry_cache is not None:
+                geometry_cache.store(cache_key, meshes)
+            return
+
         cores = self.create_and_merge_cores_from_json(
             core_config)
+        meshes = {}
         
         # FEATURE Enhance json file modularity
         for core_name, core_data in core_config["cores"].items():
@@ -48,7 +72,8 @@ class NucleusGenerator:
                 self.remesh = Nucleus_modulator.mod_remesh_sharp(
                     core, core_data["remesh"])
                 Nucleus_modulator.apply_modifier(self.remesh)
-                Nucleus_modulator.noise_vertices(core, core_data["noise_vertices_2"])
+                Nucleus_modulator.noise_vertices(core, core_data["noise_vertices_2"],
+                                                 Nucleus_modulator.core_seed(core_name, core_data, "noise_vertices_2"))
 
                 if "noise_displace_rough" in core_data:
                     noise_displace_rough_data = core_data["noise_displace_rough"]
@@ -66,10 +91,76 @@ class NucleusGenerator:
 
                 TextureHandler.material_link("AsteroidSurface.001", core)
                 TextureHandler.material_displacement("AsteroidSurface.001", 2.4)
+                meshes[core_name] = self.mesh_to_arrays(core)
             except:
                 logging.info(f"Created all cores")
                 pass
 
+        if geometry_cache is not None and meshes:
+            geometry_cache.store(cache_key, meshes)
+
+    def get_geometry_cache(self, core_config):
+        """
+        Get the geometry cache and the key of the nucleus.
+        The key covers the cores and merges of the config, which include the seeds, the engine and the Blender version, as the modifiers depend on it.
+
+        :param core_config: The nucleus config
+        :type core_config: dict
+        :return: The cache and the key, both None if no geometry_cache_dir is set in the paths.json
+        :rtype: tuple
+        """
+        if not paths.get("geometry_cache_dir"):
+            return None, None
+        geometry_cache = GeometryCache(paths["geometry_cache_dir"])
+        cache_key = geometry_cache.key({
+            "cores": core_config["cores"],
+            "merge": core_config["merge"],
+            "engine": core_config.get("engine", "blender"),
+            "blender": bpy.app.version_string,
+        })
+        return geometry_cache, cache_key
+
+    def mesh_to_arrays(self, core):
+        """
+        Read the mesh of a core into arrays for the geometry cache.
+
+        :param core: The core
+        :type core: CoreGenerator
+        :return: The arrays of the mesh, see :class:`GeometryCache`
+        :rtype: dict
+        """
+        mesh = core.object.data
+        vertices = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+        mesh.vertices.foreach_get("co", vertices)
+        loop_vertices = np.empty(len(mesh.loops), dtype=np.int32)
+        mesh.loops.foreach_get("vertex_index", loop_vertices)
+        loop_starts = np.empty(len(mesh.polygons), dtype=np.int32)
+        mesh.polygons.foreach_get("loop_start", loop_starts)
+        loop_totals = np.empty(len(mesh.polygons), dtype=np.int32)
+        mesh.polygons.foreach_get("loop_total", loop_totals)
+        return {
+            "vertices": vertices.reshape(-1, 3),
+            "loop_vertices": loop_vertices,
+            "loop_starts": loop_starts,
+            "loop_totals": loop_totals,
+            "matrix_world": np.array(core.object.matrix_world, dtype=np.float32),
+        }
+
+    def load_cores(self, meshes):
+        """
+        Create the cores from mesh arrays, e.g. of the geometry cache or the :class:`NucleusShapeEngine`, skipping all operators and modifiers.
+
+        :param meshes: The arrays of each core keyed by the core name, see :class:`GeometryCache`
+        :type meshes: dict
+        """
+        for core_name, arrays in meshes.items():
+            logging.info(f"Loading core {core_name} from arrays...")
+            core = CoreGenerator()
+            core.load(core_name, arrays)
+            self.core_generators[core_name] = core
+            TextureHandler.material_link("AsteroidSurface.001", core)
+            TextureHandler.material_displacement("AsteroidSurface.001", 2.4)
+
 
     def create_and_merge_cores_from_json(self, core_config):
         """
@@ -104,7 +195,8 @@ class NucleusGenerator:
             core.translate(translation)
             core.rotate(rotation)
             core.shape(shape)
-            Nucleus_modulator.noise_vertices(core, noise_vertices)
+            Nucleus_modulator.noise_vertices(core, noise_vertices,
+                                             Nucleus_modulator.core_seed(core_name, core_data, "noise_vertices"))
 
             core_objects[core_name] = core
         # Merge cores
@@ -259,6 +351,35 @@ class CoreGenerator:
         self.object = bpy.context.active_object
         self.object.name = obj_name
 
+    def load(self, obj_name, arrays):
+        """
+        Create the object from the arrays of a mesh, as stored by the geometry cache.
+        The faces are shaded smooth.
+
+        :param obj_name: The name of the object.
+        :type obj_name: str
+        :param arrays: The vertices, face corners, faces and world matrix of the mesh, see :class:`GeometryCache`
+        :type arrays: dict
+        """
+        logging.info(f"Loading mesh: {obj_name}...")
+        mesh = bpy.data.meshes.new(obj_name)
+        mesh.vertices.add(len(arrays["vertices"]))
+        mesh.vertices.foreach_set("co", arrays["vertices"].ravel())
+        mesh.loops.add(len(arrays["loop_vertices"]))
+        mesh.loops.foreach_set("vertex_index", arrays["loop_vertices"])
+        mesh.polygons.add(len(arrays["loop_starts"]))
+        mesh.polygons.foreach_set("loop_start", arrays["loop_starts"])
+        mesh.polygons.foreach_set("loop_total", arrays["loop_totals"])
+        mesh.polygons.foreach_set("use_smooth", np.ones(len(arrays["loop_starts"]), dtype=bool))
+        mesh.update()
+        mesh.validate()
+
+        self.object = bpy.data.objects.new(obj_name, mesh)
+        bpy.context.collection.objects.link(self.object)
+        self.object.matrix_world = Matrix(arrays["matrix_world"].tolist())
+        bpy.context.view_layer.objects.active = self.object
+        self.object.select_set(True)
+
     def translate(self, location):
         """
         Translate the icosphere object.
@@ -393,20 +514,42 @@ class Nucleus_modulator:
         mod_remesh.use_smooth_shade = remesh_param['shade']
         return mod_remesh.name
 
-    def noise_vertices(target_object, noise_intensity):
+    def core_seed(core_name, core_data, step):
+        """
+        Creates the seed of a random step of a core, so every core and step draws its own reproducible noise.
+
+        :param core_name: The name of the core
+        :type core_name: str
+        :param core_data: The config of the core, its "seed" is used if given
+        :type core_data: dict
+        :param step: The name of the step, e.g. noise_vertices
+        :type step: str
+        :return: The seed
+        :rtype: np.random.SeedSequence
+        """
+        return core_seed(core_name, core_data, step)
+
+    def noise_vertices(target_object, noise_intensity, seed=None):
         """
-        This adapts the verticles of the object randomly. The result is random but depends on the amount of subdivisions and the noise intensity
+        This adapts the verticles of the object randomly. The result is random but depends on the amount of subdivisions and the noise intensity.
+        All coordinates are read into one array, offset together and written back.
 
         :param target_object: the object given to the function where the noise shall be applied to
         :type target_object: bpy.types.Object
         :param noise_intensity: The intensity of the noise to be applied
         :type noise_intensity: int
+        :param seed: The seed of the noise, see :func:`core_seed`. The noise is not reproducible if not given
+        :type seed: np.random.SeedSequence
         """
         logging.info(f"Applying noise to {target_object.object.name}...")
-        for v in target_object.object.data.vertices:
-            coreMerge_noise_vector = Vector(
-                (noise.random(), noise.random(), noise.random())) * noise_intensity
-            v.co += coreMerge_noise_vector
+        mesh = target_object.object.data
+        coordinates = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+        mesh.vertices.foreach_get("co", coordinates)
+        # Each coordinate is moved by a uniform random value between 0 and the noise intensity
+        rng = np.random.default_rng(seed)
+        coordinates += rng.random(coordinates.size, dtype=np.float32) * np.float32(noise_intensity)
+        mesh.vertices.foreach_set("co", coordinates)
+        mesh.update()
 
 
     def mod_add_subdivision(target_object, levels, render_levels):
@@ -4,15 +4,23 @@ import sys
 import json
 import logging
 import os
+import queue
 import subprocess
-import time
+import threading
 # from src.utils.OutputLogger import OutputLogger
 
-with open('src/config/paths.json', 'r') as f:
+with open(os.environ.get('FLYBYGEN_PATHS', 'src/config/paths.json'), 'r') as f:
     paths = json.load(f)
 
 sys.path.append(paths['project_directory'])
+from src.utils.RenderCache import RenderCache, scene_configs
+from src.utils.RenderScheduler import RenderScheduler, ProcProbe, GpuProbe
 
+# Prefix of the result lines of the render worker and single pass layer name, have to match the ones in RenderFrame.py
+WORKER_RESULT_MARKER = "FLYBYGEN_RENDER_RESULT "
+SINGLE_PASS_LAYER = "single_pass"
+# Number of render workers a job is sent to, a stopped worker is replaced and its job is sent to the new one
+MAX_WORKER_ATTEMPTS = 2
 
 
 class DatasetGenerator:
@@ -68,6 +76,7 @@ class DatasetGenerator:
         according to scene id given.
         Each frame will be rendered according to the layers specified. The layers will be selected by
         :func:```set_rendered_objects(self, material)```.
+        With "single_pass" enabled, all layers of a frame are written from a single render instead.
         
         Parameters:
             parameters (dict): A dictionary containing the data on the scene, 
@@ -99,43 +108,143 @@ class DatasetGenerator:
             logging.error(f"Start frame number must be smaller than end frame number!"+
                       "Check the render.json for the correct definition")
 
-        gpu_memory_threshold = sum(self.get_gpu_memory_total())
-        gpu_memory = gpu_memory_threshold
-        logging.info(f"GPU memory available: {gpu_memory}")
-        # Set parameters from Json
-        threshold_factor = 2.0
-        load_delay = 4
-        processes = []
+        render_cache = self.get_render_cache(parameters)
+        scene_configs = self.get_scene_configs()
+        single_pass = parameters.get("single_pass", False)
+        combination_output_dir = os.path.join(output_dir, f"{scene_id}", f"{combination_id}")
+        render_jobs = []
         for frame in range(start_frame, end_frame + 1):
             logging.info(f"Rendering frame: {frame}...")
+            layer_renders = []
             for layer, object_name in render_layers.items():
                 logging.info(f"Rendering layer: {layer}...")
-                frame_output_path = os.path.join(
-                    output_dir, f"{scene_id}",f"{combination_id}", f"{layer}", f"frame_")
+                frame_output_path = os.path.join(combination_output_dir, f"{layer}", f"frame_")
                 logging.info(f"Frame Output path: {frame_output_path}")
-                while True:
-                    time.sleep(load_delay)
-                    video_ram = self.get_gpu_memory_usage()
-                    logging.info(f"Memory utilization: {video_ram}")  
-                    if video_ram and all(mem < gpu_memory_threshold for mem in video_ram):
-                        # GPU memory is below the threshold, start rendering
-                        frame_process = self.render_frame(object_name, frame, frame_output_path)
-                        if gpu_memory_threshold == gpu_memory:
-                            logging.info(f"Setting GPU memory threshold...")
-                            max_gpu_memory_usage = self.get_max_gpu_memory_usage(10)
-                            logging.info(f"Maximum GPU usage is: {max_gpu_memory_usage}")
-                            gpu_memory_threshold = gpu_memory - (max_gpu_memory_usage * threshold_factor)
-                            logging.info(f"GPU memory threshold set to: {gpu_memory_threshold}")
-                        break
-                    
-                    logging.warning("Waiting for GPU memory to become available...")
-                                      
-                processes.append(frame_process)
-                logging.info(f"There are {len(processes)} running.")
-            
-        for process in processes:
-            process.wait()
-            
+                frame_file = f"{frame_output_path}{frame:04d}.png"
+                cache_key = render_cache.key(scene_configs, object_name, frame) if render_cache is not None else None
+                layer_renders.append((object_name, frame_output_path, cache_key, frame_file))
+            # In single pass mode all layers of a frame are rendered together
+            render_groups = [layer_renders] if single_pass else [[layer_render] for layer_render in layer_renders]
+            for render_group in render_groups:
+                cache_entries = [(cache_key, frame_file) for _, _, cache_key, frame_file in render_group]
+                if render_cache is not None:
+                    if all(render_cache.restore(cache_key, frame_file) for cache_key, frame_file in cache_entries):
+                        continue
+                    # Never render into an existing file, it may be a hard link into the cache
+                    for _, frame_file in cache_entries:
+                        if os.path.exists(frame_file):
+                            os.remove(frame_file)
+                if single_pass:
+                    render_jobs.append((SINGLE_PASS_LAYER, frame, combination_output_dir, cache_entries))
+                else:
+                    object_name, frame_output_path, _, _ = render_group[0]
+                    render_jobs.append((object_name, frame, frame_output_path, cache_entries))
+
+        worker_config = parameters.get("render_worker", {})
+        if worker_config.get("enabled", False):
+            finished_jobs = self.render_with_workers(render_jobs, worker_config["workers"])
+        else:
+            finished_jobs = self.render_with_processes(render_jobs, parameters.get("scheduler", {}))
+        for object_name, frame, frame_output_path, cache_entries in finished_jobs:
+            for cache_key, frame_file in cache_entries:
+                if cache_key is not None:
+                    render_cache.store(cache_key, frame_file)
+
+    def render_with_processes(self, render_jobs, scheduler_config):
+        """
+        Renders every job in its own blender process. A new process is started as soon as the
+        resources it needs are free, see :class:`RenderScheduler`.
+
+        Example of the scheduler configuration in render.json, with the resources a single render needs:
+
+        .. code-block:: text
+
+            "scheduler":{
+                "cpu": 4,
+                "ram_mb": 8000,
+                "gpu_mb": 6000,
+                "max_jobs": 0
+            }
+
+        Parameters:
+            render_jobs (list): Tuples of the material, frame, output path and the cache keys and image files of each render.
+            scheduler_config (dict): The resources each render needs and the maximum number of renders, 0 for no limit.
+
+        Returns:
+            list: The jobs which rendered successfully.
+        """
+        probes = [ProcProbe()]
+        gpu_probe = GpuProbe()
+        if gpu_probe.available():
+            probes.append(gpu_probe)
+        else:
+            logging.info(f"No GPU found, scheduling renders by CPU and RAM only")
+        demand = {resource: amount for resource, amount in scheduler_config.items() if resource != "max_jobs"}
+        scheduler = RenderScheduler(probes, demand, scheduler_config.get("max_jobs", 0))
+        return scheduler.run(render_jobs, lambda render_job: self.render_frame(*render_job[:3]))
+
+    def render_with_workers(self, render_jobs, worker_count):
+        """
+        Renders the jobs with long running render workers, which load the render file only once.
+        Each worker renders one job after another, see :class:`RenderWorkerPool`.
+
+        Parameters:
+            render_jobs (list): Tuples of the material, frame, output path and the cache keys and image files of each render.
+            worker_count (int): The number of render workers running at the same time.
+
+        Returns:
+            list: The jobs which rendered successfully.
+        """
+        if not render_jobs:
+            return []
+        worker_command = [
+            "blender",
+            "-b", paths['render_file'],
+            "-P", paths['render_executable'],
+            "--", "--cycles-device", "OPTIX", "--worker"
+        ]
+        worker_pool = RenderWorkerPool(worker_command, min(worker_count, len(render_jobs)))
+        try:
+            finished_jobs = worker_pool.render(render_jobs)
+        finally:
+            worker_pool.close()
+        if worker_pool.failed_jobs:
+            logging.error(f"{len(worker_pool.failed_jobs)} of {len(render_jobs)} render jobs failed")
+        return finished_jobs
+
+    def get_render_cache(self, parameters):
+        """
+        Creates the render cache as configured in render.json.
+
+        Example of the render cache configuration in render.json:
+
+        .. code-block:: text
+
+            "render_cache":{
+                "enabled": true,
+                "max_size_gb": 100
+            }
+
+        Parameters:
+            parameters (dict): A dictionary containing the render parameters.
+
+        Returns:
+            RenderCache: The render cache, None if it is disabled.
+        """
+        cache_config = parameters.get("render_cache", {})
+        if not cache_config.get("enabled", False):
+            return None
+        return RenderCache(paths["render_cache_dir"], cache_config["max_size_gb"])
+
+    def get_scene_configs(self):
+        """
+        Merges every config which defines the rendered scene, so identical scenes get the same render cache key, see :func:`scene_configs`.
+
+        Returns:
+            dict: The nucleus, dust jet, animation and render configs.
+        """
+        return scene_configs(paths)
+
     def render_frame(self, layer, frame, output_path):
         paths
         render_command = [
@@ -150,36 +259,156 @@ class DatasetGenerator:
             )
         return frame_process
 
-    def get_gpu_memory_usage(self):
-        try:
-            result = subprocess.run(['nvidia-smi', '--query-gpu=memory.used', '--format=csv,nounits,noheader'],
-                                    stdout=subprocess.PIPE, universal_newlines=True)
-            memory_used = [int(x) for x in result.stdout.strip().split('\n')]
-            return memory_used
-        except Exception as e:
-            logging.error(f"Error: {e}")
-            return None
-    def get_gpu_memory_total(self):
-        try:
-            result = subprocess.run(['nvidia-smi', '--query-gpu=memory.free', '--format=csv,nounits,noheader'],
-                                    stdout=subprocess.PIPE, universal_newlines=True)
-            memory_total = [int(x) for x in result.stdout.strip().split('\n')]
-            return memory_total
-        except Exception as e:
-            logging.error(f"Error: {e}")
-            return None
 
-    def get_max_gpu_memory_usage(self, test_duration):
+class RenderWorkerPool:
+    """
+    Pool of blender processes which keep the render file loaded and render one job after another.
+    Jobs are sent as JSON lines through stdin of the worker, see :func:`RenderFrame.run_worker`.
+    A worker which stops is replaced by a new one and its job is sent again, up to MAX_WORKER_ATTEMPTS times.
+    Jobs which fail or cannot be rendered by any worker are collected in failed_jobs.
+    """
+    def __init__(self, worker_command, worker_count):
+        """
+        Starts the render workers.
+
+        Parameters:
+            worker_command (list): The command starting a single render worker.
+            worker_count (int): The number of render workers.
+        """
+        logging.info(f"Starting {worker_count} render workers")
+        self.worker_command = worker_command
+        self.workers = [self.start_worker() for _ in range(worker_count)]
+        self.failed_jobs = []
+
+    def start_worker(self):
+        """
+        Starts a single render worker.
+
+        Returns:
+            subprocess.Popen: The render worker.
+        """
+        return subprocess.Popen(
+            self.worker_command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            bufsize=1
+            )
 
-        # Get the current time
-        start_time = time.time()
-        max_gpu_memory_usage = 0
-        # Run the loop for the specified duration
-        while time.time() - start_time < test_duration:
-            if max_gpu_memory_usage < self.get_gpu_memory_usage()[0]:
-                max_gpu_memory_usage = self.get_gpu_memory_usage()[0]
-            time.sleep(0.1)
+    def render(self, render_jobs):
+        """
+        Renders all jobs, each worker takes the next job from a shared queue when it finished its last one.
 
-        return max_gpu_memory_usage
+        Parameters:
+            render_jobs (list): Tuples of the material, frame, output path and the cache keys and image files of each render.
 
+        Returns:
+            list: The jobs which rendered successfully, all others are in failed_jobs.
+        """
+        job_queue = queue.Queue()
+        for job_id, render_job in enumerate(render_jobs):
+            job_queue.put((job_id, render_job, 1))
+        finished_jobs = []
+        threads = [threading.Thread(target=self.run_worker_jobs, args=(worker_index, job_queue, finished_jobs))
+                   for worker_index in range(len(self.workers))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Jobs are only left if no worker could be restarted
+        while not job_queue.empty():
+            job_id, render_job, _ = job_queue.get_nowait()
+            logging.error(f"Render job {job_id} of layer {render_job[0]} frame {render_job[1]} was not rendered, all render workers stopped")
+            self.failed_jobs.append(render_job)
+        return finished_jobs
 
+    def run_worker_jobs(self, worker_index, job_queue, finished_jobs):
+        """
+        Sends jobs from the queue to a single worker until the queue is empty.
+        If the worker stops, it is replaced and its job is queued again until it reached MAX_WORKER_ATTEMPTS.
+
+        Parameters:
+            worker_index (int): The index of the render worker in workers.
+            job_queue (queue.Queue): Queue of the job ids, jobs and attempts.
+            finished_jobs (list): List the successfully rendered jobs are appended to.
+        """
+        while True:
+            try:
+                job_id, render_job, attempt = job_queue.get_nowait()
+            except queue.Empty:
+                return
+            worker = self.workers[worker_index]
+            object_name, frame, frame_output_path, _ = render_job
+            job = {"id": job_id, "layer": object_name, "frame": frame, "output_path": frame_output_path}
+            try:
+                worker.stdin.write(json.dumps(job) + "\n")
+                worker.stdin.flush()
+                result = self.read_result(worker)
+            except OSError as e:
+                logging.error(f"Render worker {worker.pid} stopped: {e}")
+                result = None
+            if result is None:
+                logging.error(f"Render worker {worker.pid} stopped during job {job_id} of layer {object_name} frame {frame}")
+                if attempt < MAX_WORKER_ATTEMPTS:
+                    job_queue.put((job_id, render_job, attempt + 1))
+                else:
+                    logging.error(f"Render job {job_id} of layer {object_name} frame {frame} is lost after {attempt} attempts")
+                    self.failed_jobs.append(render_job)
+                if not self.restart_worker(worker_index):
+                    return
+            elif result["status"] == "ok":
+                finished_jobs.append(render_job)
+            else:
+                logging.error(f"Render job {job_id} failed: {result.get('error')}")
+                self.failed_jobs.append(render_job)
+
+    def restart_worker(self, worker_index):
+        """
+        Replaces a stopped render worker by a new one.
+
+        Parameters:
+            worker_index (int): The index of the render worker in workers.
+
+        Returns:
+            bool: True if the new worker was started.
+        """
+        worker = self.workers[worker_index]
+        worker.kill()
+        worker.wait()
+        try:
+            self.workers[worker_index] = self.start_worker()
+        except OSError as e:
+            logging.error(f"Restarting render worker {worker.pid} failed: {e}")
+            return False
+        logging.info(f"Replaced render worker {worker.pid} by {self.workers[worker_index].pid}")
+        return True
+
+    def read_result(self, worker):
+        """
+        Reads the output of a worker until the result of its current job, forwarding all other output to the log.
+
+        Parameters:
+            worker (subprocess.Popen): The render worker.
+
+        Returns:
+            dict: The result of the job, None if the worker stopped.
+        """
+        for line in worker.stdout:
+            if line.startswith(WORKER_RESULT_MARKER):
+                return json.loads(line[len(WORKER_RESULT_MARKER):])
+            logging.info(line.rstrip())
+        return None
+
+    def close(self):
+        """
+        Stops all render workers.
+        """
+        for worker in self.workers:
+            try:
+                worker.stdin.write(json.dumps({"exit": True}) + "\n")
+                worker.stdin.close()
+            except OSError:
+                pass
+        for worker in self.workers:
+            worker.wait()
+        logging.info(f"Stopped all render workers")
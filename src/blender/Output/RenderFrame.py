@@ -6,11 +6,15 @@ import os
 import logging
 # from src.utils.OutputLogger import OutputLogger
 
-with open('src/config/paths.json', 'r') as f:
+with open(os.environ.get('FLYBYGEN_PATHS', 'src/config/paths.json'), 'r') as f:
     paths = json.load(f)
 
 sys.path.append(paths['project_directory'])
 
+# Prefix of the result lines of the render worker, which separates them from the output of blender
+WORKER_RESULT_MARKER = "FLYBYGEN_RENDER_RESULT "
+# Layer name which renders all render layers of render.json at once, see RenderFrame.render_single_pass
+SINGLE_PASS_LAYER = "single_pass"
 
 
 class RenderFrame:
@@ -21,15 +25,112 @@ class RenderFrame:
     """
     def __init__(self) -> None:
         logging.basicConfig(level=logging.INFO)
+        if sys.argv[8] == "--worker":
+            self.run_worker()
+            return
         layer = sys.argv[8]
         frame = int(sys.argv[9])
         output_path = sys.argv[10]
         logging.info(f"Render subprocess starting with: \nLayer: {layer}\nFrame: {frame}\nOutput Path: {output_path} ")
+        self.render(layer, frame, output_path)
+
+    def render(self, layer, frame, output_path):
+        """
+        Renders a single frame of the given layer and saves it
+
+        Parameters:
+            layer (str): The material of the layer, see :func:`set_rendered_objects`.
+                With SINGLE_PASS_LAYER all layers are rendered at once, see :func:`render_single_pass`
+            frame (int): The frame to render
+            output_path (str): The path prefix of the image, the frame number and file extension are appended.
+                For SINGLE_PASS_LAYER the directory containing the layer directories
+        """
+        if layer == SINGLE_PASS_LAYER:
+            self.render_single_pass(frame, output_path)
+            return
         self.set_rendered_objects(layer)
         bpy.context.scene.render.filepath = f"{output_path}{frame:04d}.png"
         bpy.context.scene.frame_set(frame)
         bpy.ops.render.render(write_still=True)
 
+    def run_worker(self):
+        """
+        Keeps the render file loaded and renders jobs received through stdin until stdin is closed or an exit job is received.
+        This avoids loading the render file and building the scene for every single image.
+
+        Each job is a JSON line with the fields id, layer, frame and output_path.
+        After each job a result line starting with WORKER_RESULT_MARKER is written to stdout,
+        followed by a JSON object with the id of the job and its status.
+        """
+        logging.info(f"Render worker ready")
+        for line in sys.stdin:
+            job = json.loads(line)
+            if job.get("exit", False):
+                break
+            logging.info(f"Render worker starting job {job['id']}: \nLayer: {job['layer']}\nFrame: {job['frame']}\nOutput Path: {job['output_path']} ")
+            try:
+                self.render(job["layer"], job["frame"], job["output_path"])
+                result = {"id": job["id"], "status": "ok"}
+            except Exception as e:
+                logging.error(f"Render job {job['id']} failed: {e}")
+                result = {"id": job["id"], "status": "error", "error": str(e)}
+            print(WORKER_RESULT_MARKER + json.dumps(result), flush=True)
+        logging.info(f"Render worker finished")
+
+
+    def render_single_pass(self, frame, output_dir):
+        """
+        Renders the frame once with all materials active and writes every render layer of render.json from this render.
+
+        Each layer material gets its own pass index. The compositor masks the combined image with the material index pass
+        and writes one image per layer with File Output nodes, which replaces a separate holdout render per layer.
+        Unlike the holdout renders, the layer images contain the light of the full scene.
+
+        Parameters:
+            frame (int): The frame to render
+            output_dir (str): The directory in which each layer is written to its own directory
+        """
+        with open(paths['render_configs']) as json_file:
+            render_layers = json.load(json_file)["render_layers"]
+        logging.info(f"Rendering layers {list(render_layers)} in a single pass...")
+        self.set_rendered_objects("all")
+        scene = bpy.context.scene
+        scene.view_layers["ViewLayer"].use_pass_material_index = True
+        scene.render.use_compositing = True
+        scene.use_nodes = True
+        tree = scene.node_tree
+        for node in [node for node in tree.nodes if node.name.startswith("SinglePass")]:
+            tree.nodes.remove(node)
+
+        render_node = tree.nodes.new("CompositorNodeRLayers")
+        render_node.name = "SinglePass Render Layers"
+        file_output = tree.nodes.new("CompositorNodeOutputFile")
+        file_output.name = "SinglePass File Output"
+        file_output.base_path = output_dir
+        file_output.format.file_format = scene.render.image_settings.file_format
+        file_output.format.color_mode = scene.render.image_settings.color_mode
+        file_output.format.color_depth = scene.render.image_settings.color_depth
+        file_output.file_slots.clear()
+        for pass_index, (layer, material) in enumerate(render_layers.items(), start=1):
+            # The frame number is appended to the slot path by the File Output node
+            file_output.file_slots.new(f"{layer}/frame_")
+            if material == "all":
+                tree.links.new(render_node.outputs["Image"], file_output.inputs[-1])
+                continue
+            bpy.data.materials[material].pass_index = pass_index
+            id_mask = tree.nodes.new("CompositorNodeIDMask")
+            id_mask.name = f"SinglePass ID Mask {layer}"
+            id_mask.index = pass_index
+            id_mask.use_antialiasing = True
+            set_alpha = tree.nodes.new("CompositorNodeSetAlpha")
+            set_alpha.name = f"SinglePass Set Alpha {layer}"
+            tree.links.new(render_node.outputs["IndexMA"], id_mask.inputs["ID value"])
+            tree.links.new(render_node.outputs["Image"], set_alpha.inputs["Image"])
+            tree.links.new(id_mask.outputs["Alpha"], set_alpha.inputs["Alpha"])
+            tree.links.new(set_alpha.outputs["Image"], file_output.inputs[-1])
+
+        scene.frame_set(frame)
+        bpy.ops.render.render()
 
     # FEATURE: Make the activate and deactivation of materials more flexible
     def set_rendered_objects(self, material):
@@ -4,7 +4,8 @@
 import bpy
 import sys
 import json
-with open('src/config/paths.json', 'r') as f:
+import os
+with open(os.environ.get('FLYBYGEN_PATHS', 'src/config/paths.json'), 'r') as f:
    paths = json.load(f)  
 
 sys.path.append(paths['project_directory'])
@@ -2,8 +2,9 @@ import bpy
 from math import radians as rad
 import sys
 import json
+import os
 import logging
-with open('src/config/paths.json', 'r') as f:
+with open(os.environ.get('FLYBYGEN_PATHS', 'src/config/paths.json'), 'r') as f:
    paths = json.load(f)  
 
 sys.path.append(paths['project_directory'])
@@ -11,7 +11,7 @@ import json
 import sys
 import time
 import logging
-with open('src/config/paths.json', 'r') as f:
+with open(os.environ.get('FLYBYGEN_PATHS', 'src/config/paths.json'), 'r') as f:
     paths = json.load(f)
 sys.path.append(paths['project_directory'])
 from src.utils.modularity import ModuleManager
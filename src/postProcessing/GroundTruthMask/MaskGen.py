@@ -2,6 +2,8 @@ import logging
 import os
 import sys
 import concurrent.futures
+import multiprocessing
+import time
 import json
 import logging
 import cv2
@@ -12,15 +14,24 @@ with open('src/config/paths.json', 'r') as f:
     paths = json.load(f)
 
 sys.path.append(paths['project_directory'])
+from src.postProcessing.ImageIO import find_image, is_image_file, read_image
+
+# Pixels brighter than this are part of the object, the former 8 bit grayscale value of 1 rounded up
+# BUG: Quickfix for background dust from plasma, needs to be fixed in the render
+MASK_THRESHOLD = 1.5 / 255
+COMPOSITION_POLICIES = ["priority", "bitmask"]
 
 
 class MaskGenerator:
     """
     Class for generating masks based on image types and configurations.
     """
-    def __init__(self):
+    def __init__(self, process=True):
         """
         Initializes the MaskGenerator class.
+
+        Args:
+            process (bool): If the masks of the dataset shall be created, otherwise only the configuration is loaded.
         """
         logging.info(f"Starting Mask Gen")
         
@@ -50,7 +61,8 @@ class MaskGenerator:
         logging.info(f"Output directory: {self.output_dir}")
         
         # Process all image types in the input directory
-        self.process_all_image_types(self.input_dir)
+        if process:
+            self.process_all_image_types(self.input_dir)
 
 
     def get_mask_image_paths(self, input_dir, image_type):
@@ -69,15 +81,16 @@ class MaskGenerator:
         if "all" in image_type:
             # If the image type is "all", get all the images in the input directory
             base_dir = os.path.join(input_dir, image_type)
-            all_images = [f for f in os.listdir(base_dir) if f.endswith(".png")]
+            all_images = [f for f in os.listdir(base_dir) if is_image_file(f)]
             mask_image_paths.extend([os.path.join(base_dir, image) for image in all_images])
             
             if "noise" in image_type:
                 # If the image type contains "noise", get the noise types from the image type
                 noise_types = image_type.split("_")[2:]
                 for noise_type in noise_types:
-                    # For each noise type, get the images in the corresponding noise directory
-                    mask_image_paths.extend([os.path.join(input_dir, f"noise_{noise_type}", image) for image in all_images])
+                    # For each noise type, get the images in the corresponding noise directory, which may be stored with another encoding
+                    noise_paths = [find_image(os.path.join(input_dir, f"noise_{noise_type}", image)) for image in all_images]
+                    mask_image_paths.extend([path for path in noise_paths if path is not None])
             
             object_dirs = ["jets", "nucleus"]
             for object_dir in object_dirs:
@@ -85,7 +98,7 @@ class MaskGenerator:
                 path_object_type = os.path.join(input_dir, object_dir)
                 if (os.path.exists(path_object_type)):
                 # For each object directory, get the images in that directory
-                    object_images = [f for f in os.listdir(os.path.join(input_dir, object_dir)) if f.endswith(".png")]
+                    object_images = [f for f in os.listdir(os.path.join(input_dir, object_dir)) if is_image_file(f)]
                     mask_image_paths.extend([os.path.join(input_dir, object_dir, image) for image in object_images])
                     logging.info("Adding object label paths")
                 else:
@@ -103,15 +116,186 @@ class MaskGenerator:
         Returns:
             numpy.ndarray: The created mask.
         """
-        # Read the image from the given path in grayscale
-        image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
-        
+        # Read the image from the given path in its native bit depth
+        image, _ = read_image(image_path)
+        return self.label_image(image, image_type)
+
+    def label_image(self, image, image_type):
+        """
+        Create a mask from an image which is already decoded.
+
+        Args:
+            image (numpy.ndarray): The image as returned by read_image.
+            image_type (int): The mask value of the object.
+
+        Returns:
+            numpy.ndarray: The created mask.
+        """
         # Create a mask by setting all non-zero pixels in the image to the given image_type value
-        # BUG: Quickfix for background dust from plasma, needs to be fixed in the render
-        mask = np.where((image > 1), image_type, 0)
-        
-        
-        return mask
+        return np.where(self.object_mask(image), np.uint8(image_type), np.uint8(0))
+
+    def object_mask(self, image):
+        """
+        Find the pixels of the object in an image which is already decoded.
+
+        Args:
+            image (numpy.ndarray): The image as returned by read_image.
+
+        Returns:
+            numpy.ndarray: True for every pixel of the object.
+        """
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        return image > MASK_THRESHOLD
+
+    def compose_masks(self, object_masks):
+        """
+        Compose the masks of all objects of a frame into one label image in a single vectorized pass.
+
+        The policy is set by "composition" in the mask configuration:
+
+        - priority: each pixel gets the mask value of the first object of the "priority" list covering it.
+          Objects which are not listed follow in the order of "objects".
+        - bitmask: each object sets its own bit, in the order of "objects", so overlaps can be separated again.
+
+        Args:
+            object_masks (dict): The boolean mask of each object of the frame, keyed by object name.
+
+        Returns:
+            numpy.ndarray: The label image.
+
+        Raises:
+            ValueError: If the composition policy is unknown.
+        """
+        objects = self.mask_config.get("objects", {})
+        composition = self.mask_config.get("composition", {})
+        policy = composition.get("policy", "priority")
+        if policy not in COMPOSITION_POLICIES:
+            raise ValueError(f"Unknown mask composition policy {policy}, use one of {COMPOSITION_POLICIES}")
+        priority = composition.get("priority", [])
+        object_names = [name for name in priority if name in object_masks]
+        object_names += [name for name in objects if name in object_masks and name not in object_names]
+        stack = np.stack([object_masks[name] for name in object_names])
+
+        if policy == "bitmask":
+            bits = {name: 1 << index for index, name in enumerate(objects)}
+            dtype = np.uint8 if len(objects) <= 8 else np.uint16
+            weights = np.array([bits[name] for name in object_names], dtype=dtype)
+            # The bits are distinct, so the sum is the same as combining them with or
+            return np.tensordot(weights, stack, axes=1).astype(dtype)
+
+        # Label 0 is the background, label i the i-th object of the priority order
+        values = np.array([0] + [objects[name] for name in object_names], dtype=np.uint8)
+        labels = np.argmax(stack, axis=0) + 1
+        labels[~stack.any(axis=0)] = 0
+        return values[labels]
+
+    def annotate_frame(self, object_masks):
+        """
+        Create the instance annotations of a frame. Each connected component of an object mask is an instance,
+        its bounding box, pixel area and centroid are taken from the component statistics
+        and its mask is run length encoded. The masks of all components of an object are encoded in one pass over its labels.
+
+        Args:
+            object_masks (dict): The boolean mask of each object of the frame, keyed by object name.
+
+        Returns:
+            list: COCO style annotations without ids, the category is the mask value of the object.
+        """
+        objects = self.mask_config.get("objects", {})
+        annotation_config = self.mask_config.get("annotations", {})
+        min_area = annotation_config.get("min_area", 1)
+        annotations = []
+        # The annotations follow the order of the objects in the mask configuration
+        for object_name in [name for name in objects if name in object_masks]:
+            count, components, stats, centroids = cv2.connectedComponentsWithStats(
+                object_masks[object_name].astype(np.uint8), connectivity=annotation_config.get("connectivity", 8))
+            segmentations = self.encode_label_rles(components, count)
+            # Component 0 is the background
+            for component in range(1, count):
+                x, y, width, height, area = stats[component]
+                if area < min_area:
+                    continue
+                annotations.append({
+                    "category_id": objects[object_name],
+                    "bbox": [int(x), int(y), int(width), int(height)],
+                    "area": int(area),
+                    "centroid": [float(centroids[component][0]), float(centroids[component][1])],
+                    "segmentation": segmentations[component],
+                    "iscrowd": 0,
+                })
+        return annotations
+
+    def encode_rle(self, mask):
+        """
+        Run length encode a mask in the uncompressed COCO format, which counts the pixels in column major order
+        starting with the background.
+
+        Args:
+            mask (numpy.ndarray): The boolean mask.
+
+        Returns:
+            dict: The size and the run lengths of the mask.
+        """
+        return self.encode_label_rles(mask.astype(np.int32), 2)[1]
+
+    def encode_label_rles(self, labels, count):
+        """
+        Run length encode the mask of every label of a label image, see :func:`encode_rle`.
+        The labels are traversed once in column major order and their runs are grouped by label,
+        so the cost grows with the pixels and runs of the image instead of the pixels times the number of labels.
+
+        Args:
+            labels (numpy.ndarray): The label image, 0 is the background.
+            count (int): The number of labels including the background.
+
+        Returns:
+            list: The size and the run lengths of the mask of each label, indexed by the label.
+        """
+        pixels = labels.ravel(order="F")
+        size = [int(labels.shape[0]), int(labels.shape[1])]
+        starts = np.concatenate([[0], np.flatnonzero(pixels[1:] != pixels[:-1]) + 1])
+        lengths = np.diff(np.append(starts, pixels.size))
+        run_labels = pixels[starts]
+        # Group the runs by label, keeping them in column major order within each label
+        order = np.argsort(run_labels, kind="stable")
+        starts, lengths, run_labels = starts[order], lengths[order], run_labels[order]
+        splits = np.cumsum(np.bincount(run_labels, minlength=count))[:-1]
+
+        rles = []
+        for label_starts, label_lengths in zip(np.split(starts, splits), np.split(lengths, splits)):
+            # The counts alternate between the background before each run and the run itself
+            counts = np.empty(2 * len(label_starts) + 1, dtype=np.int64)
+            ends = label_starts + label_lengths
+            counts[0:-1:2] = label_starts - np.concatenate([[0], ends[:-1]])
+            counts[1::2] = label_lengths
+            counts[-1] = pixels.size - (ends[-1] if len(ends) else 0)
+            if len(label_starts) and counts[-1] == 0:
+                counts = counts[:-1]
+            rles.append({"size": size, "counts": counts.tolist()})
+        return rles
+
+    def write_annotations(self, annotation_path, frame_annotations):
+        """
+        Write the annotations of all frames of a combination as COCO style JSON.
+
+        Args:
+            annotation_path (str): The path of the JSON file.
+            frame_annotations (dict): The image size and the annotations of each frame, keyed by the file name of the frame.
+        """
+        coco = {
+            "images": [],
+            "annotations": [],
+            "categories": [{"id": value, "name": name} for name, value in self.mask_config.get("objects", {}).items()],
+        }
+        for image_id, image_filename in enumerate(sorted(frame_annotations), start=1):
+            (height, width), annotations = frame_annotations[image_filename]
+            coco["images"].append({"id": image_id, "file_name": image_filename, "width": width, "height": height})
+            for annotation in annotations:
+                coco["annotations"].append({"id": len(coco["annotations"]) + 1, "image_id": image_id, **annotation})
+        with open(annotation_path, 'w') as f:
+            json.dump(coco, f)
+        logging.info(f"Saved {len(coco['annotations'])} annotations to {annotation_path}")
 
     def get_mask_value_from_path(self, image_path):
         """
@@ -134,6 +318,12 @@ class MaskGenerator:
                 break
         
         if object_name is None:
+            # Noise images are stored in the folder of their noise type
+            noises = self.mask_config.get("noises", {})
+            image_folder = os.path.basename(os.path.dirname(image_path))
+            for noise_type in noises:
+                if image_folder == f"noise_{noise_type}":
+                    return noises[noise_type], noise_type
             return None
         
         # Return the mask value and name corresponding to the object_name
@@ -142,6 +332,8 @@ class MaskGenerator:
     def process_all_image_types(self, input_dir):
         """
         Process all image types in the input directory.
+        The combinations are independent, so each combination is one task of the executor defined by
+        "executor" in the mask configuration: a process pool, a thread pool or serial.
 
         Args:
             input_dir (str): The input directory.
@@ -152,76 +344,148 @@ class MaskGenerator:
             if os.path.isdir(os.path.join(input_dir, combo_folders)):
                 folder_paths = os.path.join(input_dir, combo_folders)
                 temp_output_path = os.path.join(self.output_dir, combo_folders)
-            input_folders[combo_folders] = [folder_paths, temp_output_path]
+                input_folders[combo_folders] = [folder_paths, temp_output_path]
             # logging.info(f"Combo folders: {combo_folders}")
         logging.info(f"All folders paths: {input_folders}")
-        for input_dir_path in input_folders:
-        
-            # # Create the output directory if it doesn't exist
-            # if not os.path.exists(self.output_dir):
-            #     os.makedirs(self.output_dir)
-            path_input_combo = input_folders[input_dir_path][0]
-            path_output_combo = input_folders[input_dir_path][1]
-            if not os.path.exists(path_output_combo):
-                os.makedirs(path_output_combo)
-            logging.info(f"Created output directory: {path_output_combo}")
-            all_folders = [folder for folder in os.listdir(path_input_combo) if folder.startswith("all")]
-            logging.info(f"Folders: {all_folders}")
-            # Iterate through each image type folder
-            for image_type_name in all_folders:
-                logging.info(f"Image type name: {image_type_name}")
-                # Create an empty mask
-                mask = np.zeros(self.image_shape, dtype=np.uint8)
-
-                # Get the paths of mask images for the current image type
-                mask_image_paths = self.get_mask_image_paths(path_input_combo, image_type_name)
-                logging.info(f"Processing {image_type_name}:")
-                logging.info(f"Mask image paths: {mask_image_paths}")
-                logging.info("\n")
-
-                # Iterate through each mask image path
-                combined_masks = {}
-                for image_path in mask_image_paths:
-                    image_filename = os.path.basename(image_path)
-                    if not "all" in image_path:
-                        logging.info(f"Getting mask for: {image_path}")
-
-                        # Get the mask value and name from the image path
-                        mask_value, mask_name = self.get_mask_value_from_path(image_path)
-                        logging.info(f"Got mask {mask_name} with value {mask_value}")
-
-                        # Create a single mask based on the image path and mask value
-                        single_mask = self.create_mask(image_path, mask_value)
-
-                        # Define the path to save the single mask
-                        # Get the image file name from the image path
-                        logging.info(f"Image file name: {image_filename}")
-                        path_mask = os.path.join(path_output_combo, mask_name)
-                        if not os.path.exists(path_mask):
-                            os.makedirs(path_mask)
-                        single_mask_path = os.path.join(path_mask,image_filename)
-                        logging.info(f"Saving to: {single_mask_path}")
-
-                        # Save the single mask as an image
-                        cv2.imwrite(single_mask_path, single_mask)
-                        # Add the single mask to the overall mask
-                        if image_filename not in combined_masks:
-                            combined_masks[image_filename] = single_mask
-                        else:
-                            combined_masks[image_filename] += single_mask
-
-                
-                for key, mask in combined_masks.items():
-                    # Define the path to save the combined mask
-                            
-                    if not os.path.exists(os.path.join(path_output_combo, "combined")):
-                        os.makedirs(os.path.join(path_output_combo, "combined"))
-                    full_mask_path = os.path.join(path_output_combo, "combined", key)
-                    logging.info(full_mask_path)
-                    # Save the full mask as an image
-                    cv2.imwrite(full_mask_path, mask)
-
-        # logging.info(f"{image_filenames[0]}")
-        # self.apply_noise_to_dataset(image_filenames[0], noise_config)
-        # with concurrent.futures.ThreadPoolExecutor() as executor:
-        #     executor.map(lambda filename: self.apply_noise_to_dataset(filename, noise_config), image_filenames)
+
+        executor_config = self.mask_config.get("executor", {})
+        backend = executor_config.get("backend", "serial")
+        start_time = time.time()
+        failures = []
+        if backend == "serial":
+            for combination, (path_input_combo, path_output_combo) in input_folders.items():
+                try:
+                    self.log_task_time(combination, self.process_combination(path_input_combo, path_output_combo))
+                except Exception as e:
+                    failures.append((combination, repr(e)))
+        else:
+            with self.create_executor(backend, executor_config.get("workers", 0)) as executor:
+                futures = {executor.submit(self.process_combination, path_input_combo, path_output_combo): combination
+                           for combination, (path_input_combo, path_output_combo) in input_folders.items()}
+                for future in concurrent.futures.as_completed(futures):
+                    try:
+                        self.log_task_time(futures[future], future.result())
+                    except Exception as e:
+                        failures.append((futures[future], repr(e)))
+
+        for combination, error in failures:
+            logging.error(f"Creating the masks of {combination} failed: {error}")
+        logging.info(f"Created the masks of {len(input_folders) - len(failures)} of {len(input_folders)} combinations in {time.time()-start_time}s")
+
+    def log_task_time(self, combination, task_time):
+        """
+        Log the time a combination took.
+
+        Args:
+            combination (str): The name of the combination.
+            task_time (float): The time in seconds.
+        """
+        logging.info(f"Created the masks of {combination} in {task_time}s")
+
+    def create_executor(self, backend, workers):
+        """
+        Create the executor of the given backend.
+        Processes are forked, as the module is loaded dynamically and cannot be imported by spawned processes.
+        Where fork is not available, threads are used instead.
+
+        Args:
+            backend (str): Either threads or processes.
+            workers (int): The number of workers, 0 for one per core.
+
+        Returns:
+            concurrent.futures.Executor: The executor.
+        """
+        workers = workers or None
+        if backend == "processes":
+            if "fork" in multiprocessing.get_all_start_methods():
+                return concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"))
+            logging.warning(f"Processes cannot be forked on this system, using threads instead")
+        elif backend != "threads":
+            logging.error(f"Unknown executor backend {backend}, using threads instead")
+        return concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+
+    def process_combination(self, path_input_combo, path_output_combo):
+        """
+        Process all image types of a combination.
+
+        Args:
+            path_input_combo (str): The folder of the combination.
+            path_output_combo (str): The mask output folder of the combination.
+
+        Returns:
+            float: The time the combination took in seconds.
+        """
+        start_time = time.time()
+        if not os.path.exists(path_output_combo):
+            os.makedirs(path_output_combo)
+        logging.info(f"Created output directory: {path_output_combo}")
+        all_folders = [folder for folder in os.listdir(path_input_combo) if folder.startswith("all")]
+        logging.info(f"Folders: {all_folders}")
+        # The object and noise images are shared by the image types of the combination,
+        # so each mask is only created once and the other image types refer to it
+        created_masks = set()
+        frame_annotations = {}
+        # Iterate through each image type folder
+        for image_type_name in all_folders:
+            logging.info(f"Image type name: {image_type_name}")
+
+            # Get the paths of mask images for the current image type
+            mask_image_paths = self.get_mask_image_paths(path_input_combo, image_type_name)
+            logging.info(f"Processing {image_type_name}:")
+            logging.info(f"Mask image paths: {mask_image_paths}")
+            logging.info("\n")
+
+            # Iterate through each mask image path, collecting the object masks of each frame
+            frame_masks = {}
+            for image_path in mask_image_paths:
+                # Masks are always stored as PNG, whatever encoding the image has
+                image_filename = os.path.splitext(os.path.basename(image_path))[0] + ".png"
+                if not "all" in image_path:
+                    # Get the mask value and name from the image path
+                    mask_info = self.get_mask_value_from_path(image_path)
+                    if mask_info is None:
+                        logging.warning(f"No mask value configured for {image_path}")
+                        continue
+                    mask_value, mask_name = mask_info
+                    if (mask_name, image_filename) in created_masks:
+                        continue
+                    created_masks.add((mask_name, image_filename))
+                    logging.info(f"Getting mask {mask_name} with value {mask_value} for: {image_path}")
+
+                    # Create a single mask based on the image path and mask value
+                    image, _ = read_image(image_path)
+                    object_mask = self.object_mask(image)
+                    single_mask = np.where(object_mask, np.uint8(mask_value), np.uint8(0))
+
+                    # Define the path to save the single mask
+                    # Get the image file name from the image path
+                    logging.info(f"Image file name: {image_filename}")
+                    path_mask = os.path.join(path_output_combo, mask_name)
+                    if not os.path.exists(path_mask):
+                        os.makedirs(path_mask)
+                    single_mask_path = os.path.join(path_mask,image_filename)
+                    logging.info(f"Saving to: {single_mask_path}")
+
+                    # Save the single mask as an image
+                    cv2.imwrite(single_mask_path, single_mask)
+                    # Only the objects are part of the combined mask
+                    if mask_name in self.mask_config.get("objects", {}):
+                        frame_masks.setdefault(image_filename, {})[mask_name] = object_mask
+
+            
+            for key, object_masks in frame_masks.items():
+                mask = self.compose_masks(object_masks)
+                if self.mask_config.get("annotations", {}).get("enabled", False):
+                    frame_annotations[key] = (mask.shape[:2], self.annotate_frame(object_masks))
+                # Define the path to save the combined mask
+                        
+                if not os.path.exists(os.path.join(path_output_combo, "combined")):
+                    os.makedirs(os.path.join(path_output_combo, "combined"))
+                full_mask_path = os.path.join(path_output_combo, "combined", key)
+                logging.info(full_mask_path)
+                # Save the full mask as an image
+                cv2.imwrite(full_mask_path, mask)
+
+        if frame_annotations:
+            self.write_annotations(os.path.join(path_output_combo, "annotations.json"), frame_annotations)
+        return time.time() - start_time
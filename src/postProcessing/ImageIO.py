@@ -0,0 +1,112 @@
+import os
+# OpenCV reads and writes EXR files only if this is set before the codec is used
+os.environ.setdefault("OPENCV_IO_ENABLE_OPENEXR", "1")
+import cv2
+import numpy as np
+
+# Extension and stored type of each output encoding
+ENCODINGS = {
+    "png8": (".png", np.uint8),
+    "png16": (".png", np.uint16),
+    "tiff": (".tiff", np.float32),
+    "exr": (".exr", np.float32),
+}
+IMAGE_EXTENSIONS = (".png", ".tif", ".tiff", ".exr")
+
+
+def is_image_file(filename):
+    """
+        :param filename: The file name
+        :type: str
+        :return: True if the file is an image which can be read by :func:`read_image`
+        :type: bool
+    """
+    return filename.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def find_image(path):
+    """
+        Finds the image stored under the path with any of the image extensions,
+        e.g. the noise of an image which was written with another encoding than the image itself.
+
+        :param path: The path of the image, its extension is ignored
+        :type: str
+        :return: The path of the existing image, None if there is none
+        :type: str
+    """
+    stem = os.path.splitext(path)[0]
+    for extension in IMAGE_EXTENSIONS:
+        if os.path.exists(stem + extension):
+            return stem + extension
+    return None
+
+
+def read_image(path, scale=1.0):
+    """
+        Reads an image in its native bit depth and returns it as float32.
+        Integer images are divided by the maximum of their type, so 8 and 16 bit images share the same range.
+        Float images, e.g. EXR, are kept as they are. An alpha channel is returned separately.
+
+        :param path: The path of the image
+        :type: str
+        :param scale: The value the maximum of an integer image is mapped to, e.g. 255 to work in 8 bit units with 16 bit precision
+        :type: float
+        :return: The color or grayscale image and the alpha channel, which is None if the image has none
+        :type: tuple
+    """
+    image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    if image is None:
+        raise IOError(f"Could not read image {path}")
+    if np.issubdtype(image.dtype, np.integer):
+        factor = np.float32(scale / np.iinfo(image.dtype).max)
+    else:
+        factor = np.float32(scale)
+    image = image.astype(np.float32)
+    image *= factor
+
+    alpha = None
+    if image.ndim == 3 and image.shape[2] in (2, 4):
+        image, alpha = image[..., :-1], image[..., -1]
+        if image.shape[2] == 1:
+            image = image[..., 0]
+    return image, alpha
+
+
+def write_image(path, image, encoding="png16", scale=1.0, alpha=None):
+    """
+        Writes an image with the given encoding. The extension of the path is replaced by the one of the encoding.
+        Integer encodings are saturated to the range of their type, float encodings keep values above the range.
+
+        :param path: The path of the image
+        :type: str
+        :param image: The image in the range of 0 to scale
+        :type: np.array
+        :param encoding: One of png8, png16, tiff and exr
+        :type: str
+        :param scale: The value which is mapped to the maximum of an integer encoding
+        :type: float
+        :param alpha: An alpha channel to store with the image, in the same range as the image
+        :type: np.array
+        :return: The path the image was written to
+        :type: str
+    """
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown image encoding {encoding}, supported are {list(ENCODINGS)}")
+    extension, dtype = ENCODINGS[encoding]
+    path = os.path.splitext(path)[0] + extension
+    if not cv2.haveImageWriter(path):
+        raise IOError(f"OpenCV was built without support for writing {extension} images")
+
+    if alpha is not None:
+        if image.ndim == 2:
+            image = image[..., np.newaxis]
+        image = np.concatenate([image, alpha[..., np.newaxis]], axis=-1)
+    image = image.astype(np.float32)
+    image /= np.float32(scale)
+    if np.issubdtype(dtype, np.integer):
+        image *= np.iinfo(dtype).max
+        np.rint(image, out=image)
+        np.clip(image, 0, np.iinfo(dtype).max, out=image)
+    if not cv2.imwrite(path, image.astype(dtype)):
+        raise IOError(f"Could not write image {path}")
+    return path
@@ -2,87 +2,153 @@ import logging
 import os
 import sys
 import concurrent.futures
+import hashlib
+import multiprocessing
 import json
 import logging
 import cv2
 from PIL import Image
 import numpy as np
-import random
 import itertools
 with open('src/config/paths.json', 'r') as f:
     paths = json.load(f)
 
 sys.path.append(paths['project_directory'])
+from src.postProcessing.Noise.SensorNoise import SensorNoiseModel
+from src.postProcessing.ImageIO import is_image_file, read_image, write_image
 
 
 class BasicNoiseGenerator:
     """
         Allows to create basic noise for a given dataset folder defined in the json file.
         Currently, Gaussian, Poisson, and Salt/Pepper noise are supported.
+        Additionally, the sensor noise model of :class:`SensorNoiseModel` can be applied to each batch of images.
         This generator creates noise according to the noise.json and creates all combinations of the different noises in different images.
         This generator supports multithreading.
+        With store disabled in the noise.json, no images are written and the noise is applied on the fly by :class:`NoiseAugmentation`.
+        Images are read in their native bit depth and processed as float32 in 8 bit units, the output is written with the encoding of the noise.json.
     """
-    def __init__(self):
+    def __init__(self, process=True):
+        """
+            :param process: If the dataset shall be processed according to the noise.json, otherwise only the config is loaded
+            :type: bool
+        """
         logging.info(f"Starting Noise Gen")
         with open(paths['noise_config']) as json_file:
             noise_params = json.load(json_file)
-        with open(paths['render_configs']) as json_file:
-            render_params = json.load(json_file)
+        executor_config = noise_params.pop("executor", {})
+        self.seed = noise_params.pop("seed", 0)
+        store = noise_params.pop("store", True)
+        self.encoding = noise_params.pop("encoding", "png16")
+        self.sensor_config = noise_params.pop("sensor", {"enabled": False})
+        self.sensor_model = None
+        self.noise_config = noise_params
         self.dataset_folder = paths["dataset_cache"]+paths["pipeline_version"]+paths["number_of_generation"]
         self.processing_basis = paths["post_processing_basis"]
         self.processing_output = paths["noise_output"]
-        self.image_shape = (render_params["output_format"]["resolution_x"], render_params["output_format"]["resolution_y"])
+        self.dataset_id = paths["pipeline_version"]+paths["number_of_generation"]
 
-        self.process_dataset(noise_params)
+        if not process:
+            return
+        if store:
+            self.process_dataset(noise_params, executor_config)
+        else:
+            logging.info(f"Storing noise is disabled, the noise is applied on the fly by NoiseAugmentation")
 
-    def create_gaussian_noise(self, mean=0.0, std=1.0):
+    def image_id(self, image_path):
         """
-            Creates Gaussian noise according to the defined image size
+            The identity of an image which its random streams are derived from.
+            It is the path of the image relative to the dataset folder, so the same image gets the same noise
+            from this generator, :class:`NoiseAugmentation` and the post processing pipeline.
 
+            :param image_path: The path of the image
+            :type: str
+            :return: The identity of the image
+            :type: str
+        """
+        return os.path.relpath(image_path, self.dataset_folder).replace(os.sep, "/")
+
+    def create_rng(self, image_id, noise_type):
+        """
+            Creates the random number generator of a noise of an image.
+            The stream is derived from the seed, the dataset, the image and the noise type,
+            so the noise is the same in every run, independent of the order and the workers the images are processed in.
+
+            :param image_id: The identity of the image, see :func:`image_id`
+            :type: str
+            :param noise_type: The noise type as named in the noise config
+            :type: str
+            :return: The random number generator
+            :type: np.random.Generator
+        """
+        entropy = [self.seed]
+        for name in (self.dataset_id, image_id, noise_type):
+            entropy.append(int.from_bytes(hashlib.sha256(name.encode()).digest()[:16], "little"))
+        return np.random.default_rng(np.random.SeedSequence(entropy))
+
+    def create_gaussian_noise(self, image, mean=0.0, std=1.0, rng=None):
+        """
+            Creates Gaussian noise with the size of the image
+
+            :param image: The image, only its height and width are used
+            :type: np.array
             :param mean: Mean value of the gaussian distribution (default: 0.0)
             :type: float
             :param std: Standard deviation of the distribution (default: 1.0)
             :type: float
+            :param rng: Random number generator used for the noise, a new unseeded one if not given
+            :type: np.random.Generator
             :return: np array with image dimensions and generated noise
             :type: np.array
         """
-        noise_grayscale = np.random.normal(mean, std, self.image_shape)
+        if rng is None:
+            rng = np.random.default_rng()
+        noise_grayscale = rng.normal(mean, std, image.shape[:2])
         noise_gaus = np.stack([noise_grayscale] * 3, axis=-1)
         noise_gaus = np.clip(noise_gaus, 0, 255).astype(np.uint8)
         return noise_gaus
 
 
-    def create_poisson_noise(self, image, poisson_amount=0.05):
+    def create_poisson_noise(self, image, poisson_amount=0.05, rng=None):
         """
             Creates Poisson noise based on the image and the defined image size
 
             :param poisson_amount: Intensity of the Poisson noise (default: 0.05)
             :type: float
+            :param rng: Random number generator used for the noise, a new unseeded one if not given
+            :type: np.random.Generator
             :return: np array with image dimensions and generated noise
             :type: np.array
         """
-        noisy_image_r = np.random.poisson(image[:,:,0] * (1 + poisson_amount))
+        if rng is None:
+            rng = np.random.default_rng()
+        noisy_image_r = rng.poisson(image[:,:,0] * (1 + poisson_amount))
         noise = np.stack([noisy_image_r] * 3, axis=-1)
         noise = np.clip(noise, 0, 255).astype(np.uint8)
         return noise
 
-    def create_salt_and_pepper_noise(self, image, amount=0.05):
+    def create_salt_and_pepper_noise(self, image, amount=0.05, rng=None):
         """
-            Creates Salt and Pepper noise based on the image and the defined image size
+            Creates Salt and Pepper noise based on the image and the defined image size.
+            The noisy pixels and their values are drawn at once for the whole image.
 
             :param poisson_amount: Intensity of the Salt and Pepper noise (default: 0.05)
             :type: float
+            :param rng: Random number generator used for the noise, a new unseeded one if not given
+            :type: np.random.Generator
             :return: np array with image dimensions and generated noise
             :type: np.array
         """
-        noise_sp = np.zeros_like(image)
-        num_pixels = int(np.prod(self.image_shape) * amount)
+        if rng is None:
+            rng = np.random.default_rng()
+        noise_sp = np.zeros_like(image, dtype=np.uint8)
+        height, width = image.shape[:2]
+        num_pixels = int(height * width * amount)
 
-        for _ in range(num_pixels):
-            x = random.randint(0, self.image_shape[0] - 1)
-            y = random.randint(0, self.image_shape[1] - 1)
-            noise_sp[x, y] = random.choice([0, 255])
-        noise_sp = np.clip(noise_sp, 0, 255).astype(np.uint8)
+        x = rng.integers(0, height, size=num_pixels)
+        y = rng.integers(0, width, size=num_pixels)
+        values = rng.choice(np.array([0, 255], dtype=np.uint8), size=num_pixels)
+        noise_sp[x, y] = values[:, np.newaxis] if noise_sp.ndim == 3 else values
         return noise_sp
 
     def store_noises(self, image_filename, noise_list):
@@ -98,11 +164,10 @@ class BasicNoiseGenerator:
             noise_type_dir = os.path.join(self.dataset_folder, f"noise_{noise_type}")
             if not os.path.exists(noise_type_dir):
                 os.makedirs(noise_type_dir)
-            noise_path = os.path.join(noise_type_dir, image_filename)
-            cv2.imwrite(noise_path, noise)
+            noise_path = write_image(os.path.join(noise_type_dir, image_filename), noise, self.encoding, scale=255.0)
             logging.info(f"Noise saved to {noise_path}")
 
-    def store_noisy_images(self, image_filename, noisy_image_list):
+    def store_noisy_images(self, image_filename, noisy_image_list, alpha=None):
         """
             Save each create image with noise as image separately
 
@@ -110,43 +175,133 @@ class BasicNoiseGenerator:
             :type: str
             :param noise_list: List of noisy images generated
             :type: list
+            :param alpha: The alpha channel of the base image, which is stored with each noisy image
+            :type: np.array
         """
         for noisy_image, noise_type in noisy_image_list:
             noisy_image_type_image_dir = os.path.join(self.dataset_folder, f"all_noise_{noise_type}")
             if not os.path.exists(noisy_image_type_image_dir):
                 os.makedirs(noisy_image_type_image_dir)
-            noisy_image_path = os.path.join(noisy_image_type_image_dir, image_filename)
-            cv2.imwrite(noisy_image_path, noisy_image)
+            noisy_image_path = write_image(os.path.join(noisy_image_type_image_dir, image_filename), noisy_image,
+                                           self.encoding, scale=255.0, alpha=alpha)
             logging.info(f"Noisy image {image_filename} saved to {noisy_image_path}")
 
-    def mix_noises(self, image, noise_list):
+    def mix_noises(self, image, noise_list, subsets=None):
         """
-            Create each combination of the different available noises
-            
+            Create the combinations of the different available noises.
+            Each combination is derived from the sum of its parent combination, which lacks its last noise,
+            so every combination costs a single addition.
+            The sums are accumulated in float32 and saturated once at the end, so the result does not depend on the order of the noises.
+
             :param image: Passes the base image on which the noise shall be applied
             :type: np.array
             :param noise_list: List of noises generated
             :type: list
+            :param subsets: The combinations to create, each given as tuple of noise types, e.g. ("sp", "gauss"). All combinations are created if not given
+            :type: list
+            :return: List of the noisy images and their combination names
+            :type: list
         """
         logging.info(f"Mixing noises...")
+        noise_types = [noise_type for _, noise_type in noise_list]
+        if subsets is None:
+            subsets = [combination for r in range(1, len(noise_list) + 1)
+                       for combination in itertools.combinations(noise_types, r)]
+        sums = {(): image.astype(np.float32)}
         noisy_images = []
 
-        for r in range(1, len(noise_list) + 1):
-            for combination in itertools.combinations(noise_list, r):
-                noisy_image = image.copy()  # Create a copy of the original image
-                logging.info(f"Combination...")
-                combination_name = ""
-                for noise, noise_type in combination:
-                    combination_name = combination_name+f"_{noise_type}"
-                    logging.info(f"Adding noise: {noise_type}")
-                    noisy_image = noisy_image + noise
-                    noisy_image = np.clip(noisy_image, 0, 255).astype(np.uint8)
-
-                noisy_images.append((noisy_image, combination_name))
-                logging.info(f"Combination name: {combination_name}")
+        for subset in subsets:
+            unknown_types = set(subset) - set(noise_types)
+            if unknown_types:
+                logging.warning(f"Skipping combination {subset}, noises {unknown_types} are not enabled")
+                continue
+            indices = tuple(sorted(set(noise_types.index(noise_type) for noise_type in subset)))
+            combination_name = "".join(f"_{noise_types[index]}" for index in indices)
+            noisy_image = np.clip(self.sum_noises(indices, noise_list, sums), 0, 255)
+            noisy_images.append((noisy_image, combination_name))
+            logging.info(f"Combination name: {combination_name}")
 
         return noisy_images
 
+    def sum_noises(self, indices, noise_list, sums):
+        """
+            Sum the base image and the noises of a combination, reusing the sum of its parent combination
+
+            :param indices: Indices of the noises of the combination in the noise list, in ascending order
+            :type: tuple
+            :param noise_list: List of noises generated
+            :type: list
+            :param sums: The sums computed so far keyed by their indices, must contain the base image for the empty tuple
+            :type: dict
+            :return: The unsaturated sum
+            :type: np.array
+        """
+        if indices not in sums:
+            sums[indices] = self.sum_noises(indices[:-1], noise_list, sums) + noise_list[indices[-1]][0]
+        return sums[indices]
+
+
+    def noise_name(self, noise_type):
+        """
+            Get the name used in the file and combination names for a noise type of the noise config
+
+            :param noise_type: The noise type as named in the noise config
+            :type: str
+            :return: The name of the noise, None if the noise is unknown
+            :type: str
+        """
+        if "SP" in noise_type:
+            return "sp"
+        elif "gaussian" in noise_type:
+            return "gauss"
+        elif "poisson" in noise_type:
+            return "poisson"
+        return None
+
+    def enabled_noise_names(self, noise_config):
+        """
+            :param noise_config: This is a dictionary loaded from a json file containing the parameters required for the creation of noise
+            :type: dict
+            :return: The names of the enabled and known noises in the order of the noise config
+            :type: list
+        """
+        return [self.noise_name(noise_type) for noise_type, noise_params in noise_config.items()
+                if noise_params["enabled"] and self.noise_name(noise_type) is not None]
+
+    def create_noisy_images(self, image_id, image, noise_config, subsets=None):
+        """
+            Creates the noises according to the noise configuration and mixes them into the image
+
+            :param image_id: The identity of the image, which the random streams of the noises are derived from, see :func:`image_id`
+            :type: str
+            :param image: The image
+            :type: np.array
+            :param noise_config: This is a dictionary loaded from a json file containing the parameters required for the creation of noise
+            :type: dict
+            :param subsets: The combinations to create, see :func:`mix_noises`
+            :type: list
+            :return: List of the noises and list of the noisy images, each with their names
+            :type: tuple
+        """
+        noise_basis_image = image.copy()
+
+        noise_list = []
+        logging.info(f"Creating noises...")
+        for noise_type, noise_params in noise_config.items():
+            logging.info(f"...{noise_type} with {noise_params}")
+            if noise_params["enabled"]:
+                rng = self.create_rng(image_id, noise_type)
+                noise_name = self.noise_name(noise_type)
+                if noise_name == "sp":
+                    noise_list.append((self.create_salt_and_pepper_noise(noise_basis_image, amount=noise_params["amount"], rng=rng), noise_name))
+                elif noise_name == "gauss":
+                    noise_list.append((self.create_gaussian_noise(noise_basis_image, mean=noise_params["mean"], std=noise_params["std"], rng=rng), noise_name))
+                elif noise_name == "poisson":
+                    noise_list.append((self.create_poisson_noise(noise_basis_image, poisson_amount=noise_params["amount"], rng=rng), noise_name))
+                else:
+                    logging.error(f"Unknown noise: {noise_type}")
+
+        return noise_list, self.mix_noises(image, noise_list, subsets)
 
 # FEATURE: Allow to apply multiple different noise configs per run
     def apply_noise_to_dataset(self, image_filename, noise_config):
@@ -158,40 +313,216 @@ class BasicNoiseGenerator:
             :param noise_config: This is a dictionary loaded from a json file containing the parameters required for the creation of noise
             :type: dict
         """
-        if image_filename.endswith(".png"):
+        if is_image_file(image_filename):
             logging.info(f"Started image {image_filename}")
             image_path = os.path.join(self.dataset_folder, self.processing_basis, image_filename)
-            image = cv2.imread(image_path)
-            noise_basis_image = image.copy()
-
-            noise_list = []
-            logging.info(f"Creating noises...")
-            for noise_type, noise_params in noise_config.items():
-                logging.info(f"...{noise_type} with {noise_params}")
-                if noise_params["enabled"]:
-                    if "SP" in noise_type:
-                        noise_sp = self.create_salt_and_pepper_noise(noise_basis_image, amount=noise_params["amount"])
-                        noise_list.append((noise_sp, "sp"))
-                    elif "gaussian" in noise_type:
-                        noise_gauss = self.create_gaussian_noise(mean=noise_params["mean"], std=noise_params["std"])
-                        noise_list.append((noise_gauss, "gauss"))
-                    elif "poisson" in noise_type:
-                        noise_poisson = self.create_poisson_noise(noise_basis_image, poisson_amount=noise_params["amount"])
-                        noise_list.append((noise_poisson, "poisson"))
-                    else:
-                        logging.error(f"Unknown noise: {noise_type}")
-
+            image, alpha = read_image(image_path, scale=255.0)
+            noise_list, noisy_images = self.create_noisy_images(self.image_id(image_path), image, noise_config)
             self.store_noises(image_filename, noise_list)
-            noisy_images = self.mix_noises(image, noise_list)
-            self.store_noisy_images(image_filename, noisy_images)
+            self.store_noisy_images(image_filename, noisy_images, alpha)
 
-    def process_dataset(self, noise_config):
+    def process_dataset(self, noise_config, executor_config):
         """
-            Runs the process with a threa pool executor to use multhreading
+            Applies the noise to every image of the dataset. The images are split into batches, which are processed
+            by the executor backend defined in the executor config:
+
+            - threads: a thread pool, which only scales as far as numpy releases the GIL
+            - processes: a process pool, which uses all cores for the Python and numpy work and the PNG encoding
+            - serial: one batch after another in this process
+
+            Errors of single images are collected and reported after all images are processed.
 
             :param noise_config: This is a dictionary loaded from a json file containing the parameters required for the creation of noise
             :type: dict
+            :param executor_config: Backend, number of workers (0 for one per core) and number of images per batch
+            :type: dict
         """
         image_filenames = os.listdir((self.dataset_folder + self. processing_basis))
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            executor.map(lambda filename: self.apply_noise_to_dataset(filename, noise_config), image_filenames)
+        batch_size = executor_config.get("batch_size", 1)
+        batches = [image_filenames[i:i + batch_size] for i in range(0, len(image_filenames), batch_size)]
+        backend = executor_config.get("backend", "threads")
+        logging.info(f"Processing {len(image_filenames)} images in {len(batches)} batches with backend {backend}")
+
+        failures = []
+        if backend == "serial":
+            for batch in batches:
+                failures += self.process_batch(batch, noise_config)
+        else:
+            with self.create_executor(backend, executor_config.get("workers", 0)) as executor:
+                futures = {executor.submit(self.process_batch, batch, noise_config): batch for batch in batches}
+                for future in concurrent.futures.as_completed(futures):
+                    try:
+                        failures += future.result()
+                    except Exception as e:
+                        # The worker itself failed, e.g. a crashed process
+                        failures += [(image_filename, repr(e)) for image_filename in futures[future]]
+
+        for image_filename, error in failures:
+            logging.error(f"Applying noise to {image_filename} failed: {error}")
+        logging.info(f"Applied noise to {len(image_filenames) - len(failures)} of {len(image_filenames)} images")
+
+    def process_batch(self, image_filenames, noise_config):
+        """
+            Applies the noise to a batch of images
+
+            :param image_filenames: The file names of the images
+            :type: list
+            :param noise_config: This is a dictionary loaded from a json file containing the parameters required for the creation of noise
+            :type: dict
+            :return: File name and error of each image which failed
+            :type: list
+        """
+        failures = []
+        for image_filename in image_filenames:
+            try:
+                self.apply_noise_to_dataset(image_filename, noise_config)
+            except Exception as e:
+                failures.append((image_filename, repr(e)))
+        if self.sensor_config["enabled"]:
+            failures += self.apply_sensor_noise(image_filenames)
+        return failures
+
+    def apply_sensor_noise(self, image_filenames):
+        """
+            Applies the sensor noise model to a batch of images in one pass and saves the results in the sensor_noise folder
+
+            :param image_filenames: The file names of the images
+            :type: list
+            :return: File name and error of each image which failed
+            :type: list
+        """
+        failures = []
+        frames = []
+        frame_filenames = []
+        for image_filename in image_filenames:
+            if not is_image_file(image_filename):
+                continue
+            try:
+                image, _ = read_image(os.path.join(self.dataset_folder, self.processing_basis, image_filename))
+            except IOError as e:
+                failures.append((image_filename, repr(e)))
+                continue
+            if frames and image.shape != frames[0].shape:
+                failures.append((image_filename, f"Image shape {image.shape} differs from {frames[0].shape}"))
+            else:
+                frames.append(image)
+                frame_filenames.append(image_filename)
+        if not frames:
+            return failures
+
+        if self.sensor_model is None or self.sensor_model.prnu.shape != frames[0].shape:
+            self.sensor_model = SensorNoiseModel(self.sensor_config, frames[0].shape)
+        rngs = [self.create_rng(self.image_id(os.path.join(self.dataset_folder, self.processing_basis, image_filename)), "sensor")
+                for image_filename in frame_filenames]
+        sensor_images = self.sensor_model.apply(np.stack(frames), rngs)
+
+        sensor_dir = os.path.join(self.dataset_folder, "sensor_noise")
+        os.makedirs(sensor_dir, exist_ok=True)
+        for sensor_image, image_filename in zip(sensor_images, frame_filenames):
+            # The quantized values of the sensor are stored as they are
+            sensor_path = os.path.join(sensor_dir, os.path.splitext(image_filename)[0] + ".png")
+            cv2.imwrite(sensor_path, sensor_image)
+            logging.info(f"Sensor noise image saved to {sensor_path}")
+        return failures
+
+    def __getstate__(self):
+        # The sensor model holds a full resolution PRNU pattern, workers create their own instead of receiving it with every batch
+        state = self.__dict__.copy()
+        state["sensor_model"] = None
+        return state
+
+    def create_executor(self, backend, workers):
+        """
+            Creates the executor of the given backend.
+            Processes are forked, as the module is loaded dynamically and cannot be imported by spawned processes.
+            Where fork is not available, threads are used instead.
+
+            :param backend: Either threads or processes
+            :type: str
+            :param workers: The number of workers, 0 for one per core
+            :type: int
+            :return: The executor
+            :type: concurrent.futures.Executor
+        """
+        workers = workers or None
+        if backend == "processes":
+            if "fork" in multiprocessing.get_all_start_methods():
+                return concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"))
+            logging.warning(f"Processes cannot be forked on this system, using threads instead")
+        elif backend != "threads":
+            logging.error(f"Unknown executor backend {backend}, using threads instead")
+        return concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+
+
+class NoiseAugmentation:
+    """
+        Applies the noise combinations of the noise.json lazily while the images are read, instead of storing every noisy image.
+        The images are identical to the ones :class:`BasicNoiseGenerator` stores before they are encoded, as the noise is drawn from the same random streams.
+        They are float32 in 8 bit units, without alpha channel.
+
+        Items are the noisy image, the image file name and the combination name, e.g. "_sp_gauss".
+        Indexing decodes the image and creates the noises of the requested combination only, so it can be used as map-style dataset,
+        e.g. as torch.utils.data.Dataset. Iterating decodes each image and creates each noise once for all its combinations.
+    """
+    def __init__(self, subsets=None, generator=None):
+        """
+            :param subsets: The combinations to create, each given as tuple of noise names, e.g. ("sp", "gauss"). All combinations of the enabled noises if not given
+            :type: list
+            :param generator: The generator holding the noise config, a new one without processing the dataset if not given
+            :type: BasicNoiseGenerator
+        """
+        self.generator = generator if generator is not None else BasicNoiseGenerator(process=False)
+        self.image_dir = os.path.join(self.generator.dataset_folder, self.generator.processing_basis)
+        self.image_filenames = sorted(filename for filename in os.listdir(self.image_dir) if is_image_file(filename))
+        noise_names = self.generator.enabled_noise_names(self.generator.noise_config)
+        if subsets is None:
+            subsets = [combination for r in range(1, len(noise_names) + 1)
+                       for combination in itertools.combinations(noise_names, r)]
+        for subset in subsets:
+            if not set(subset) <= set(noise_names):
+                raise ValueError(f"Combination {subset} contains noises which are not enabled, enabled are {noise_names}")
+        self.subsets = list(subsets)
+
+    def __len__(self):
+        return len(self.image_filenames) * len(self.subsets)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"Index {index} is out of range for {len(self)} noisy images")
+        image_index, subset_index = divmod(index, len(self.subsets))
+        image_filename = self.image_filenames[image_index]
+        subset = self.subsets[subset_index]
+        # Only the noises of the combination are needed, their random streams do not depend on the other noises
+        noise_config = {noise_type: noise_params for noise_type, noise_params in self.generator.noise_config.items()
+                        if self.generator.noise_name(noise_type) in subset}
+        _, noisy_images = self.generator.create_noisy_images(self.image_id(image_filename), self.read_image(image_filename), noise_config, [subset])
+        noisy_image, combination_name = noisy_images[0]
+        return noisy_image, image_filename, combination_name
+
+    def __iter__(self):
+        for image_filename in self.image_filenames:
+            _, noisy_images = self.generator.create_noisy_images(self.image_id(image_filename), self.read_image(image_filename),
+                                                                 self.generator.noise_config, self.subsets)
+            for noisy_image, combination_name in noisy_images:
+                yield noisy_image, image_filename, combination_name
+
+    def image_id(self, image_filename):
+        """
+            :param image_filename: The file name of the image in the post processing basis
+            :type: str
+            :return: The identity of the image, see :func:`BasicNoiseGenerator.image_id`
+            :type: str
+        """
+        return self.generator.image_id(os.path.join(self.image_dir, image_filename))
+
+    def read_image(self, image_filename):
+        """
+            :param image_filename: The file name of the image in the post processing basis
+            :type: str
+            :return: The image in 8 bit units
+            :type: np.array
+        """
+        image, _ = read_image(os.path.join(self.image_dir, image_filename), scale=255.0)
+        return image
@@ -0,0 +1,73 @@
+import logging
+import numpy as np
+
+
+class SensorNoiseModel:
+    """
+        Physically based noise model of an image sensor, applied to batches of frames.
+
+        The pixel values of the rendered frames are taken as irradiance relative to the full well capacity.
+        In a single vectorized pass over the batch the model applies, in electrons:
+
+        - photo response non-uniformity (PRNU): a fixed per-pixel gain pattern of the sensor
+        - dark current, accumulated over the exposure time
+        - shot noise of the signal and the dark current (Poisson)
+        - read noise (Gaussian)
+        - quantization by the analog to digital converter of the given bit depth
+
+        All computations are done in float32 on the batch array, without per channel copies.
+    """
+    def __init__(self, config, frame_shape):
+        """
+            :param config: The sensor config of the noise.json
+            :type: dict
+            :param frame_shape: Shape of a single frame, the PRNU pattern is created for this shape
+            :type: tuple
+        """
+        self.full_well = np.float32(config.get("full_well", 20000))
+        self.read_noise = np.float32(config.get("read_noise", 5.0))
+        self.dark_electrons = np.float32(config.get("dark_current", 0.0) * config.get("exposure_time", 1.0))
+        self.bit_depth = config.get("bit_depth", 8)
+        self.max_value = np.float32(2 ** self.bit_depth - 1)
+        # The PRNU pattern belongs to the sensor, it is the same for every frame
+        prnu_rng = np.random.default_rng(config.get("prnu_seed", 0))
+        self.prnu = 1 + prnu_rng.standard_normal(frame_shape, dtype=np.float32) * np.float32(config.get("prnu", 0.0))
+        logging.info(f"Sensor noise model: {config}")
+
+    @property
+    def dtype(self):
+        """
+            :return: The smallest unsigned integer type holding the quantized values
+            :type: np.dtype
+        """
+        return np.dtype(np.uint8) if self.bit_depth <= 8 else np.dtype(np.uint16)
+
+    def apply(self, frames, rngs):
+        """
+            Applies the sensor noise to a batch of frames
+
+            :param frames: The frames stacked along the first axis, integer images are scaled by the maximum of their type
+            :type: np.array
+            :param rngs: One random number generator per frame, so the noise of a frame does not depend on the batch
+            :type: list
+            :return: The quantized detector output in the type given by :func:`dtype`
+            :type: np.array
+        """
+        scale = np.float32(np.iinfo(frames.dtype).max) if np.issubdtype(frames.dtype, np.integer) else np.float32(1)
+        electrons = frames.astype(np.float32)
+        electrons *= self.full_well / scale
+        electrons *= self.prnu
+        electrons += self.dark_electrons
+
+        # Shot noise: the collected electrons follow a Poisson distribution
+        for frame, rng in zip(electrons, rngs):
+            frame[...] = rng.poisson(frame)
+        # Read noise of the readout electronics
+        for frame, rng in zip(electrons, rngs):
+            frame += rng.standard_normal(frame.shape, dtype=np.float32) * self.read_noise
+
+        # Conversion to digital numbers, the full well maps to the maximum value
+        electrons *= self.max_value / self.full_well
+        np.rint(electrons, out=electrons)
+        np.clip(electrons, 0, self.max_value, out=electrons)
+        return electrons.astype(self.dtype)
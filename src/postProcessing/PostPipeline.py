@@ -0,0 +1,347 @@
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+import cv2
+import numpy as np
+
+with open('src/config/paths.json', 'r') as f:
+    paths = json.load(f)
+
+sys.path.append(paths['project_directory'])
+from src.postProcessing.ImageIO import is_image_file, read_image, write_image
+from src.postProcessing.Noise.NoiseGen_basic import BasicNoiseGenerator
+from src.postProcessing.Noise.SensorNoise import SensorNoiseModel
+from src.postProcessing.GroundTruthMask.MaskGen import MaskGenerator
+
+# Layer of a combination holding the complete rendered frame
+BASE_LAYER = "all"
+
+
+class Frame:
+    """
+    A rendered frame of a combination with all its layers decoded.
+    Stages read the layers and may add their results, so later stages can use them without reading them again.
+    """
+    def __init__(self, combination, combination_dir, filename):
+        """
+        Initialize the Frame class.
+
+        Args:
+            combination (str): The name of the combination folder.
+            combination_dir (str): The path of the combination folder.
+            filename (str): The file name of the frame.
+        """
+        self.combination = combination
+        self.combination_dir = combination_dir
+        self.filename = filename
+        # Image and alpha channel of each layer, in the range of 0 to 1
+        self.layers = {}
+        # Results of the stages, e.g. the noises of the noise stage
+        self.results = {}
+
+    @property
+    def key(self):
+        """
+        str: Identifies the frame within the dataset.
+        """
+        return f"{self.combination}/{self.filename}"
+
+
+class PostStage:
+    """
+    Base class of the stages of the :class:`PostPipeline`.
+    A stage gets every frame once and hands the images it creates to the write function instead of writing them itself.
+    """
+    def layers(self):
+        """
+        Get the layers the stage needs besides the base layer.
+
+        Returns:
+            list: The layer names.
+        """
+        return []
+
+    def process(self, frame, write):
+        """
+        Process a frame.
+
+        Args:
+            frame (Frame): The decoded frame.
+            write (function): Queues a write, called with the path, the image and the keyword arguments of :func:`write_image`.
+        """
+        raise NotImplementedError
+
+    def finish(self):
+        """
+        Called once after all frames are processed, e.g. to write results collected over all frames.
+        """
+        pass
+
+
+class SensorModelCache:
+    """
+    Shares the sensor model between the worker threads, so the PRNU pattern is only created once.
+    """
+    lock = threading.Lock()
+    models = {}
+
+    @classmethod
+    def get(cls, config, frame_shape):
+        """
+        Get the sensor model of a frame shape.
+
+        Args:
+            config (dict): The sensor config of the noise.json.
+            frame_shape (tuple): The shape of the frames.
+
+        Returns:
+            SensorNoiseModel: The sensor model.
+        """
+        with cls.lock:
+            if frame_shape not in cls.models:
+                cls.models[frame_shape] = SensorNoiseModel(config, frame_shape)
+            return cls.models[frame_shape]
+
+
+class NoiseStage(PostStage):
+    """
+    Applies the noises of the noise.json, as the :class:`BasicNoiseGenerator` does.
+    The noises and noisy images are stored in the combination folder.
+    """
+    def __init__(self):
+        self.generator = BasicNoiseGenerator(process=False)
+
+    def process(self, frame, write):
+        image, alpha = frame.layers[BASE_LAYER]
+        # The noise parameters are given in 8 bit units
+        image = image * np.float32(255)
+        if alpha is not None:
+            alpha = alpha * np.float32(255)
+        # The noise is drawn from the same random streams as by the BasicNoiseGenerator
+        image_id = self.generator.image_id(os.path.join(frame.combination_dir, BASE_LAYER, frame.filename))
+        noise_list, noisy_images = self.generator.create_noisy_images(image_id, image, self.generator.noise_config)
+        frame.results["noises"] = noise_list
+        for noise, noise_type in noise_list:
+            write(os.path.join(frame.combination_dir, f"noise_{noise_type}", frame.filename), noise,
+                  encoding=self.generator.encoding, scale=255.0)
+        for noisy_image, combination_name in noisy_images:
+            write(os.path.join(frame.combination_dir, f"all_noise_{combination_name}", frame.filename), noisy_image,
+                  encoding=self.generator.encoding, scale=255.0, alpha=alpha)
+
+        if self.generator.sensor_config["enabled"]:
+            base_image = frame.layers[BASE_LAYER][0]
+            sensor_model = SensorModelCache.get(self.generator.sensor_config, base_image.shape)
+            rng = self.generator.create_rng(image_id, "sensor")
+            sensor_image = sensor_model.apply(base_image[np.newaxis], [rng])[0]
+            # The quantized values of the sensor are stored as they are
+            sensor_filename = os.path.splitext(frame.filename)[0] + ".png"
+            write(os.path.join(frame.combination_dir, "sensor_noise", sensor_filename), sensor_image, raw=True)
+
+
+class MaskStage(PostStage):
+    """
+    Creates the object masks of the mask_config.json, their combined mask and, if enabled, the annotations
+    of each combination. The masks are stored in the mask output folder of the combination.
+    Unlike the :class:`MaskGenerator`, no masks of the noise images are created, and the frames are processed
+    by the workers of the pipeline instead of the executor of the mask_config.json.
+    """
+    def __init__(self):
+        self.generator = MaskGenerator(process=False)
+        self.objects = self.generator.mask_config.get("objects", {})
+        # Annotations of each frame, collected per combination
+        self.annotations = {}
+        self.lock = threading.Lock()
+
+    def layers(self):
+        return list(self.objects)
+
+    def process(self, frame, write):
+        output_dir = os.path.join(self.generator.output_dir, frame.combination)
+        mask_filename = os.path.splitext(frame.filename)[0] + ".png"
+        object_masks = {}
+        for object_name, mask_value in self.objects.items():
+            if object_name not in frame.layers:
+                continue
+            object_masks[object_name] = self.generator.object_mask(frame.layers[object_name][0])
+            mask = np.where(object_masks[object_name], np.uint8(mask_value), np.uint8(0))
+            write(os.path.join(output_dir, object_name, mask_filename), mask, raw=True)
+        if object_masks:
+            combined_mask = self.generator.compose_masks(object_masks)
+            write(os.path.join(output_dir, "combined", mask_filename), combined_mask, raw=True)
+            if self.generator.mask_config.get("annotations", {}).get("enabled", False):
+                annotations = self.generator.annotate_frame(object_masks)
+                with self.lock:
+                    self.annotations.setdefault(frame.combination, {})[mask_filename] = (combined_mask.shape[:2], annotations)
+
+    def finish(self):
+        for combination, frame_annotations in self.annotations.items():
+            output_dir = os.path.join(self.generator.output_dir, combination)
+            os.makedirs(output_dir, exist_ok=True)
+            self.generator.write_annotations(os.path.join(output_dir, "annotations.json"), frame_annotations)
+
+
+# Stages which can be listed in the pipeline config
+STAGES = {
+    "noise": NoiseStage,
+    "mask": MaskStage,
+}
+
+
+class PostPipeline:
+    """
+    Fused post processing, which decodes every rendered frame and its object layers once
+    and runs all stages of the pipeline.json on the decoded images.
+
+    Reader threads decode the frames into a bounded prefetch queue, worker threads run the stages
+    and writer threads encode and write the results from a bounded write behind queue.
+    The bounds keep the memory limited, while reading, processing and writing overlap,
+    which hides the latency of network storage.
+    """
+    def __init__(self):
+        """
+        Initialize the PostPipeline class and process the dataset.
+        """
+        logging.info(f"Starting Post Pipeline")
+        with open(paths["pipeline_config"]) as f:
+            self.config = json.load(f)
+        self.input_dir = f"{paths['dataset_cache']}{paths['pipeline_version']+paths['number_of_generation']}"
+        self.stages = [STAGES[stage]() for stage in self.config["stages"]]
+        self.failures = []
+        self.run()
+
+    def list_frames(self):
+        """
+        List the frames of all combinations of the dataset.
+
+        Returns:
+            list: The frames, which are not decoded yet.
+        """
+        frames = []
+        for combination in sorted(os.listdir(self.input_dir)):
+            combination_dir = os.path.join(self.input_dir, combination)
+            base_dir = os.path.join(combination_dir, BASE_LAYER)
+            if not os.path.isdir(base_dir):
+                continue
+            for filename in sorted(os.listdir(base_dir)):
+                if is_image_file(filename):
+                    frames.append(Frame(combination, combination_dir, filename))
+        return frames
+
+    def decode(self, frame):
+        """
+        Decode the base layer and all layers needed by the stages of a frame.
+
+        Args:
+            frame (Frame): The frame to decode.
+        """
+        layers = [BASE_LAYER] + [layer for stage in self.stages for layer in stage.layers()]
+        for layer in dict.fromkeys(layers):
+            path = os.path.join(frame.combination_dir, layer, frame.filename)
+            if layer == BASE_LAYER or os.path.exists(path):
+                frame.layers[layer] = read_image(path)
+
+    def run(self):
+        """
+        Run all stages on all frames of the dataset.
+        """
+        start_time = time.time()
+        frames = self.list_frames()
+        readers = self.config.get("readers", 2)
+        workers = self.config.get("workers", 0) or os.cpu_count() or 1
+        writers = self.config.get("writers", 4)
+        decoded_frames = queue.Queue(maxsize=self.config.get("prefetch", 8))
+        writes = queue.Queue(maxsize=self.config.get("write_behind", 64))
+        logging.info(f"Processing {len(frames)} frames with {readers} readers, {workers} workers and {writers} writers")
+
+        reader_threads = [threading.Thread(target=self.read_frames, args=(frames[i::readers], decoded_frames))
+                          for i in range(readers)]
+        worker_threads = [threading.Thread(target=self.process_frames, args=(decoded_frames, writes))
+                          for _ in range(workers)]
+        writer_threads = [threading.Thread(target=self.write_images, args=(writes,)) for _ in range(writers)]
+        for thread in reader_threads + worker_threads + writer_threads:
+            thread.start()
+
+        # Each stage of the pipeline is stopped by one end marker per thread, once the previous stage is finished
+        for thread in reader_threads:
+            thread.join()
+        for _ in worker_threads:
+            decoded_frames.put(None)
+        for thread in worker_threads:
+            thread.join()
+        for stage in self.stages:
+            try:
+                stage.finish()
+            except Exception as e:
+                self.failures.append((type(stage).__name__, repr(e)))
+        for _ in writer_threads:
+            writes.put(None)
+        for thread in writer_threads:
+            thread.join()
+
+        for item, error in self.failures:
+            logging.error(f"Post processing {item} failed: {error}")
+        logging.info(f"Post processed {len(frames)} frames with {len(self.failures)} failures in {time.time()-start_time}s")
+
+    def read_frames(self, frames, decoded_frames):
+        """
+        Decode frames into the prefetch queue.
+
+        Args:
+            frames (list): The frames to decode.
+            decoded_frames (queue.Queue): The prefetch queue.
+        """
+        for frame in frames:
+            try:
+                self.decode(frame)
+            except Exception as e:
+                self.failures.append((frame.key, repr(e)))
+                continue
+            decoded_frames.put(frame)
+
+    def process_frames(self, decoded_frames, writes):
+        """
+        Run the stages on the frames of the prefetch queue until the end marker is received.
+
+        Args:
+            decoded_frames (queue.Queue): The prefetch queue.
+            writes (queue.Queue): The write behind queue.
+        """
+        def write(path, image, raw=False, **kwargs):
+            writes.put((path, image, raw, kwargs))
+
+        while True:
+            frame = decoded_frames.get()
+            if frame is None:
+                break
+            for stage in self.stages:
+                try:
+                    stage.process(frame, write)
+                except Exception as e:
+                    self.failures.append((f"{frame.key} in {type(stage).__name__}", repr(e)))
+
+    def write_images(self, writes):
+        """
+        Write the images of the write behind queue until the end marker is received.
+        Raw images are written as they are, the others are encoded by :func:`write_image`.
+
+        Args:
+            writes (queue.Queue): The write behind queue.
+        """
+        while True:
+            item = writes.get()
+            if item is None:
+                break
+            path, image, raw, kwargs = item
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                if raw:
+                    if not cv2.imwrite(path, image):
+                        raise IOError(f"Could not write image {path}")
+                else:
+                    write_image(path, image, **kwargs)
+            except Exception as e:
+                self.failures.append((path, repr(e)))
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import logging
+import os
+import time
+
+
+class CombinationLedger:
+    """
+    Append only journal recording the state of every parameter combination of a sweep.
+
+    Each line of the journal is a JSON entry with the combination name, its state, a hash of its parameters and,
+    for completed combinations, the checksum and file sizes of its rendered output.
+    The last entry of a combination defines its state, so a sweep can be restarted after a crash
+    and only the combinations which are not completed are run again.
+    """
+    def __init__(self, ledger_file, layers=None):
+        """
+        Initialize the CombinationLedger class and load the existing journal.
+
+        Args:
+            ledger_file (str): The path to the journal file.
+            layers (list): The render layer folders of a combination which hold its rendered images.
+                Other folders, e.g. written by the post processing, are ignored. All images are listed if not given.
+        """
+        self.ledger_file = ledger_file
+        self.layers = layers
+        self.entries = {}
+        if os.path.exists(ledger_file):
+            with open(ledger_file, 'r') as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A crash while writing may leave the last line incomplete
+                        logging.warning(f"Skipping incomplete ledger entry: {line.strip()}")
+                        continue
+                    self.entries[entry["combination"]] = entry
+            logging.info(f"Loaded {len(self.entries)} combinations from ledger {ledger_file}")
+        else:
+            os.makedirs(os.path.dirname(ledger_file) or ".", exist_ok=True)
+
+    def record(self, combination, state, parameters, output_dir=None):
+        """
+        Append the state of a combination to the journal.
+
+        Args:
+            combination (str): The name of the combination.
+            state (str): The state of the combination, e.g. started, completed or failed.
+            parameters (dict): The parameters of the combination.
+            output_dir (str): The output directory of the combination. If given, the checksum and
+                file sizes of the output are recorded.
+        """
+        entry = {
+            "combination": combination,
+            "state": state,
+            "parameters": self.parameters_hash(parameters),
+            "time": time.time(),
+        }
+        if output_dir is not None:
+            entry["files"] = self.output_files(output_dir)
+            entry["checksum"] = self.output_checksum(output_dir, entry["files"])
+        with open(self.ledger_file, 'a') as file:
+            file.write(json.dumps(entry) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+        self.entries[combination] = entry
+        logging.info(f"Ledger: {combination} {state}")
+
+    def is_completed(self, combination, parameters, output_dir):
+        """
+        Check if a combination was completed with the same parameters and its output is still unchanged.
+        The file sizes are compared first, the checksum of the content is only computed if they match.
+
+        Args:
+            combination (str): The name of the combination.
+            parameters (dict): The parameters of the combination.
+            output_dir (str): The output directory of the combination.
+
+        Returns:
+            bool: True if the combination does not need to be run again.
+        """
+        entry = self.entries.get(combination)
+        if entry is None or entry["state"] != "completed":
+            return False
+        if entry["parameters"] != self.parameters_hash(parameters):
+            logging.warning(f"Parameters of {combination} changed since it was completed, running it again")
+            return False
+        files = self.output_files(output_dir)
+        if files != entry["files"] or self.output_checksum(output_dir, files) != entry["checksum"]:
+            logging.warning(f"Output of {combination} changed since it was completed, running it again")
+            return False
+        return True
+
+    def parameters_hash(self, parameters):
+        """
+        Hash the parameters of a combination independent of the key order.
+
+        Args:
+            parameters (dict): The parameters of the combination.
+
+        Returns:
+            str: The hex digest of the parameters.
+        """
+        return hashlib.sha256(json.dumps(parameters, sort_keys=True).encode()).hexdigest()
+
+    def output_files(self, output_dir):
+        """
+        List the rendered images of a combination with their sizes.
+
+        Args:
+            output_dir (str): The output directory of the combination.
+
+        Returns:
+            dict: The size of each image in the render layer folders, keyed by its path relative to the output directory.
+        """
+        files = {}
+        layer_dirs = [output_dir] if self.layers is None else [os.path.join(output_dir, layer) for layer in self.layers]
+        for layer_dir in layer_dirs:
+            for root, _, filenames in os.walk(layer_dir):
+                for filename in filenames:
+                    if filename.endswith(".png"):
+                        path = os.path.join(root, filename)
+                        files[os.path.relpath(path, output_dir).replace(os.sep, "/")] = os.path.getsize(path)
+        return files
+
+    def output_checksum(self, output_dir, files):
+        """
+        Compute the checksum over the content of the given images.
+
+        Args:
+            output_dir (str): The output directory of the combination.
+            files (dict): The images as returned by :func:`output_files`.
+
+        Returns:
+            str: The hex digest of the images.
+        """
+        checksum = hashlib.sha256()
+        for relative_path in sorted(files):
+            checksum.update(relative_path.encode())
+            with open(os.path.join(output_dir, relative_path), 'rb') as file:
+                for block in iter(lambda: file.read(1 << 20), b""):
+                    checksum.update(block)
+        return checksum.hexdigest()
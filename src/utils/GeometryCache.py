@@ -0,0 +1,103 @@
+import hashlib
+import json
+import logging
+import os
+import uuid
+import numpy as np
+
+# Arrays stored for each mesh
+MESH_ARRAYS = ("vertices", "loop_vertices", "loop_starts", "loop_totals", "matrix_world")
+
+
+class GeometryCache:
+    """
+    Cache of generated meshes, keyed by the parameters they are generated from.
+
+    Each entry holds the final meshes of a generation as compact binary arrays: the vertex coordinates,
+    the vertex index of each face corner, the first corner and the number of corners of each face
+    and the world matrix of the object. A cache hit can be turned into a mesh directly,
+    without running the operators and modifiers which generated it.
+    """
+    def __init__(self, cache_dir):
+        """
+        Initialize the GeometryCache class.
+
+        Args:
+            cache_dir (str): The directory of the cache.
+        """
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, parameters):
+        """
+        Compute the canonical key of a generation.
+
+        Args:
+            parameters (dict): Everything the meshes depend on, including the seeds.
+
+        Returns:
+            str: The hex digest identifying the generation.
+        """
+        canonical = json.dumps(parameters, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def entry_path(self, key):
+        """
+        Get the path of a cache entry.
+
+        Args:
+            key (str): The key of the generation.
+
+        Returns:
+            str: The path of the cached arrays.
+        """
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def load(self, key):
+        """
+        Load the meshes of a generation if it is in the cache.
+
+        Args:
+            key (str): The key of the generation.
+
+        Returns:
+            dict: The arrays of each mesh keyed by the object name, None on a cache miss.
+        """
+        entry = self.entry_path(key)
+        if not os.path.exists(entry):
+            return None
+        meshes = {}
+        try:
+            with np.load(entry) as arrays:
+                for name in arrays.files:
+                    object_name, array_name = name.rsplit("__", 1)
+                    meshes.setdefault(object_name, {})[array_name] = arrays[name]
+        except (OSError, ValueError) as e:
+            logging.warning(f"Loading {entry} failed: {e}")
+            return None
+        logging.info(f"Geometry cache hit: {list(meshes)}")
+        return meshes
+
+    def store(self, key, meshes):
+        """
+        Add the meshes of a generation to the cache.
+
+        Args:
+            key (str): The key of the generation.
+            meshes (dict): The arrays of each mesh keyed by the object name, see MESH_ARRAYS.
+        """
+        entry = self.entry_path(key)
+        arrays = {f"{object_name}__{array_name}": mesh[array_name]
+                  for object_name, mesh in meshes.items() for array_name in MESH_ARRAYS}
+        # Write under a unique name first, so concurrent generations never see a partial entry
+        temp_entry = f"{entry}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(temp_entry, 'wb') as file:
+                np.savez(file, **arrays)
+            os.replace(temp_entry, entry)
+        except OSError as e:
+            logging.warning(f"Caching geometry {key} failed: {e}")
+            if os.path.exists(temp_entry):
+                os.remove(temp_entry)
+            return
+        logging.info(f"Added {list(meshes)} to geometry cache")
@@ -1,8 +1,15 @@
+import concurrent.futures
+import copy
+import itertools
 import json
 import logging
 import os
 
-from src.utils.ParameterCombinationGenerator import ParameterCombinationGenerator
+from src.utils.ParameterCombinationGenerator import ParameterCombinationGenerator, CombinationSpace
+from src.utils.CombinationLedger import CombinationLedger
+
+# Content addressed caches, which are written atomically and shared by all jobs
+SHARED_CACHE_PATHS = ("render_cache_dir", "geometry_cache_dir")
 
 with open('src/config/paths.json', 'r') as f:
     paths = json.load(f)
@@ -22,13 +29,29 @@ with open('src/config/paths.json', 'r') as f:
             self.parameter_range_file = parameter_range_file
             self.increments_file = increments_file
             self.OutputLogging = OutputLogging
+            with open(paths["render_configs"], 'r') as file:
+                render_data = json.load(file)
+            self.expected_image_count = (render_data["end_frame"] - render_data["start_frame"] + 1) * len(render_data["render_layers"])
+            # The ledger keeps track of completed combinations, so a restarted sweep skips them
+            self.ledger = CombinationLedger(os.path.join(
+                paths["cache_dir"], paths["pipeline_version"] + paths["number_of_generation"], "combination_ledger.jsonl"),
+                list(render_data["render_layers"]))
 
-        def create_parameter_combinations(self):
+        def create_parameter_combinations(self, shard=(0, 1)):
             """
             Create parameter combinations based on the target, parameter range, and increments files.
 
+            The combinations are not generated here. The adjustment data is an iterator which
+            generates each combination together with its index when it is run,
+            the number of combinations is stored in combination_count.
+
+            Args:
+                shard (tuple): The zero based shard index and the number of shards. Only every
+                    shard count-th combination starting at the shard index is created, so multiple
+                    machines can run disjoint parts of the same sweep.
+
             Returns:
-                tuple: A tuple containing the adjustment data and target data.
+                tuple: A tuple containing the adjustment data iterator and target data.
             """
             # Load the JSON data from the files
             with open(self.target_file, 'r') as file:
@@ -40,24 +63,60 @@ with open('src/config/paths.json', 'r') as f:
             with open(self.increments_file, 'r') as file:
                 increments_data = json.load(file)
             logging.info(f"Opened Config range, increment and target file.")
-            ParamCombiner = ParameterCombinationGenerator()
-            self.adjustment_data = ParamCombiner.generate_parameter_combinations(parameter_range_data, increments_data)
-            logging.info(f"Created all configurations combinations.")
+            sampling = self._load_sampling_config()
+            shard_index, shard_count = shard
+            if sampling["method"] == "grid":
+                combination_space = CombinationSpace(parameter_range_data, increments_data)
+                total_count = len(combination_space)
+                self.adjustment_data = combination_space.shard(shard_index, shard_count)
+            else:
+                ParamCombiner = ParameterCombinationGenerator()
+                total_count = sampling["sample_count"]
+                samples = ParamCombiner.sample_parameter_combinations(
+                    parameter_range_data, increments_data, sampling["sample_count"], sampling["method"], sampling.get("seed", 0))
+                self.adjustment_data = itertools.islice(enumerate(samples), shard_index, None, shard_count)
+            self.combination_count = len(range(shard_index, total_count, shard_count))
+            logging.info(f"Prepared {self.combination_count} out of {total_count} configuration combinations for shard {shard_index + 1}/{shard_count}.")
             return self.adjustment_data, self.target_data
 
-        def run_parameter_combinations(self, adjustment_data, target_data, cmd):
+        def _load_sampling_config(self):
+            """
+            Load the sampling configuration defined by sampling_config in the paths file.
+            Without a sampling configuration every combination of the grid is run.
+
+            Returns:
+                dict: The sampling configuration with method, sample_count and seed.
+            """
+            if "sampling_config" not in paths:
+                return {"method": "grid"}
+            with open(paths["sampling_config"], 'r') as file:
+                sampling = json.load(file)
+            logging.info(f"Sampling configuration: {sampling}")
+            return sampling
+
+        def run_parameter_combinations(self, adjustment_data, target_data, cmd, parallel_jobs=1):
             """
             Run parameter combinations and update the target JSON file.
+            Combinations which the ledger lists as completed are skipped.
 
             Args:
-                adjustment_data (list): The list of adjustment data.
+                adjustment_data (iterable): The combination index and adjustment data of each combination.
                 target_data (dict): The target data.
                 cmd (str): The command to run for each combination.
+                parallel_jobs (int): The number of combinations run at the same time.
+                    With more than one job each combination gets its own config directory,
+                    see :func:`run_parameter_combinations_parallel`.
 
             """
+            if parallel_jobs > 1:
+                self.run_parameter_combinations_parallel(adjustment_data, target_data, cmd, parallel_jobs)
+                return
             # Update the parameters based on adjustments
-            for i, update in enumerate(adjustment_data):
-                logging.info(f"Running combination {i+1} out of {len(adjustment_data)}")
+            for n, (i, update) in enumerate(adjustment_data):
+                if self.ledger.is_completed(f"comb_{i}", update, self._combination_output_dir(f"comb_{i}")):
+                    logging.info(f"Skipping completed combination {n+1} out of {self.combination_count}: comb_{i}")
+                    continue
+                logging.info(f"Running combination {n+1} out of {self.combination_count}: comb_{i}")
                 logging.info(f"Values are: {update}")
                 self._recursive_update(target_data, update)
                 # Save the updated data back to the target JSON file
@@ -76,16 +135,180 @@ with open('src/config/paths.json', 'r') as f:
                 with open('src/config/paths.json', 'w') as file:
                     json.dump(paths, file, indent=2)
                     logging.info(f"Updated paths file: {paths}")
-                meta_param_path = os.path.join((paths["dataset_cache"] + paths["pipeline_version"] + paths["number_of_generation"]), paths["combination"])
-                os.makedirs(meta_param_path, exist_ok=True)
-                meta_param_file = os.path.join(meta_param_path, "meta_param.json")
-                with open(meta_param_file, 'w') as file:
-                    json.dump(target_data, file, indent=2)
-                    logging.info(f"Saved parameter meta to file: {meta_param_file}")
+                self._save_meta_param(paths, target_data)
+
+                self.ledger.record(f"comb_{i}", "started", update)
+                return_code = self.OutputLogging.run_subprocess(cmd)
+                self._record_result(i, update, return_code)
+            logging.info(f"Finished running all combinations")
 
-                self.OutputLogging.run_subprocess(cmd)
+        def run_parameter_combinations_parallel(self, adjustment_data, target_data, cmd, parallel_jobs):
+            """
+            Run parameter combinations with a pool of concurrently running subprocesses.
+
+            The shared target and paths files are never written. Instead each combination gets its own
+            config directory with a copy of both files, see :func:`prepare_combination_job`.
+            The subprocess finds its paths file through the FLYBYGEN_PATHS environment variable.
+
+            Args:
+                adjustment_data (iterable): The combination index and adjustment data of each combination.
+                target_data (dict): The target data.
+                cmd (str): The command to run for each combination.
+                parallel_jobs (int): The maximum number of subprocesses running at the same time.
+            """
+            logging.info(f"Running {self.combination_count} combinations with {parallel_jobs} parallel jobs")
+            failed = []
+            with concurrent.futures.ThreadPoolExecutor(max_workers=parallel_jobs) as executor:
+                running = {}
+                for n, (i, update) in enumerate(adjustment_data):
+                    if self.ledger.is_completed(f"comb_{i}", update, self._combination_output_dir(f"comb_{i}")):
+                        logging.info(f"Skipping completed combination {n+1} out of {self.combination_count}: comb_{i}")
+                        continue
+                    # Only prepare the next job once a worker is about to become free
+                    if len(running) >= parallel_jobs:
+                        failed += self._collect_finished_jobs(running)
+                    logging.info(f"Submitting combination {n+1} out of {self.combination_count}: comb_{i}")
+                    logging.info(f"Values are: {update}")
+                    job_env = self.prepare_combination_job(i, update, target_data)
+                    self.ledger.record(f"comb_{i}", "started", update)
+                    running[executor.submit(self.OutputLogging.run_subprocess, cmd, job_env)] = (i, update)
+                while running:
+                    failed += self._collect_finished_jobs(running)
+            if failed:
+                logging.error(f"Combinations failed: {sorted(failed)}")
             logging.info(f"Finished running all combinations")
 
+        def prepare_combination_job(self, combination_index, update, target_data):
+            """
+            Create the isolated config directory of a single combination.
+
+            The directory contains the updated target file and a paths file which points to it.
+            The cache directory of the job and every path within it are redirected into the config directory,
+            so the blender files saved and rendered by the job do not collide with other jobs.
+            Only the shared caches in SHARED_CACHE_PATHS are kept.
+
+            Args:
+                combination_index (int): The index of the combination.
+                update (dict): The adjustment data of the combination.
+                target_data (dict): The target data, which is not modified.
+
+            Returns:
+                dict: The environment for the subprocess of the combination.
+            """
+            combination = f"comb_{combination_index}"
+            job_dir = os.path.join(paths["cache_dir"], paths["pipeline_version"] + paths["number_of_generation"], "configs", combination)
+            os.makedirs(job_dir, exist_ok=True)
+
+            job_target_data = self._recursive_update(copy.deepcopy(target_data), update)
+            job_target_file = os.path.join(job_dir, os.path.basename(self.target_file))
+            with open(job_target_file, 'w') as file:
+                json.dump(job_target_data, file, indent=2)
+
+            job_paths = dict(paths)
+            job_paths["combination"] = combination
+            job_paths["cache_dir"] = job_dir
+            # The job saves its blender files into its own cache directory, so it has to render the scene saved there
+            job_paths["render_file"] = os.path.join(job_dir, paths["pipeline_version"] + paths["number_of_generation"],
+                                                    os.path.basename(paths["render_file"]))
+            for key, value in paths.items():
+                if not isinstance(value, str) or key in ("cache_dir", "render_file") or key in SHARED_CACHE_PATHS:
+                    continue
+                # Redirect every config entry which refers to the shared target file
+                if os.path.normpath(value) == os.path.normpath(self.target_file):
+                    job_paths[key] = job_target_file
+                elif self._is_within(value, paths["cache_dir"]):
+                    job_paths[key] = os.path.join(job_dir, os.path.relpath(value, paths["cache_dir"]))
+            job_paths_file = os.path.join(job_dir, "paths.json")
+            with open(job_paths_file, 'w') as file:
+                json.dump(job_paths, file, indent=2)
+            logging.info(f"Created config directory for {combination}: {job_dir}")
+
+            self._save_meta_param(job_paths, job_target_data)
+            return dict(os.environ, FLYBYGEN_PATHS=job_paths_file)
+
+        def _is_within(self, path, directory):
+            """
+            Check whether a path lies within a directory.
+
+            Args:
+                path (str): The path.
+                directory (str): The directory.
+
+            Returns:
+                bool: True if the path is inside the directory, but not the directory itself.
+            """
+            relative_path = os.path.relpath(os.path.abspath(path), os.path.abspath(directory))
+            return relative_path != os.curdir and not relative_path.startswith(os.pardir)
+
+        def _collect_finished_jobs(self, running):
+            """
+            Wait for at least one running job to finish and remove all finished jobs.
+
+            Args:
+                running (dict): Futures of the running jobs mapped to their combination index and adjustment data.
+
+            Returns:
+                list: Combination indices of the finished jobs which failed.
+            """
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            failed = []
+            for future in done:
+                combination_index, update = running.pop(future)
+                if not self._record_result(combination_index, update, future.result()):
+                    failed.append(combination_index)
+                logging.info(f"Finished combination comb_{combination_index}")
+            return failed
+
+        def _record_result(self, combination_index, update, return_code):
+            """
+            Record in the ledger whether a finished combination rendered all of its images.
+
+            Args:
+                combination_index (int): The index of the combination.
+                update (dict): The adjustment data of the combination.
+                return_code (int): The return code of the subprocess of the combination.
+
+            Returns:
+                bool: True if the combination completed.
+            """
+            combination = f"comb_{combination_index}"
+            output_dir = self._combination_output_dir(combination)
+            image_count = len(self.ledger.output_files(output_dir))
+            if return_code == 0 and image_count >= self.expected_image_count:
+                self.ledger.record(combination, "completed", update, output_dir)
+                return True
+            logging.error(f"Combination {combination} failed with return code {return_code} "
+                          f"and {image_count} out of {self.expected_image_count} images")
+            self.ledger.record(combination, "failed", update)
+            return False
+
+        def _combination_output_dir(self, combination):
+            """
+            Get the dataset directory of a combination.
+
+            Args:
+                combination (str): The name of the combination.
+
+            Returns:
+                str: The dataset directory of the combination.
+            """
+            return os.path.join((paths["dataset_cache"] + paths["pipeline_version"] + paths["number_of_generation"]), combination)
+
+        def _save_meta_param(self, combination_paths, target_data):
+            """
+            Save the parameters of a combination next to its rendered dataset.
+
+            Args:
+                combination_paths (dict): The paths of the combination.
+                target_data (dict): The target data of the combination.
+            """
+            meta_param_path = self._combination_output_dir(combination_paths["combination"])
+            os.makedirs(meta_param_path, exist_ok=True)
+            meta_param_file = os.path.join(meta_param_path, "meta_param.json")
+            with open(meta_param_file, 'w') as file:
+                json.dump(target_data, file, indent=2)
+                logging.info(f"Saved parameter meta to file: {meta_param_file}")
+
         def _recursive_update(self, target, source):
             """
             Recursively update target dictionary with non-dictionary values from the source.
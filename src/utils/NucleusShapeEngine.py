@@ -0,0 +1,480 @@
+import logging
+import zlib
+import numpy as np
+
+# Corners of a grid cube as offsets, and the six tetrahedra sharing the diagonal from corner 0 to corner 6
+CUBE_CORNERS = [(0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0), (0, 0, 1), (1, 0, 1), (1, 1, 1), (0, 1, 1)]
+TETRAHEDRA = [(0, 5, 1, 6), (0, 1, 2, 6), (0, 2, 3, 6), (0, 3, 7, 6), (0, 7, 4, 6), (0, 4, 5, 6)]
+# Points of the field evaluated at once, limits the memory of the lobe interpolation
+FIELD_CHUNK = 16384
+
+
+def core_seed(core_name, core_data, step):
+    """
+    Create the seed of a random step of a core, so every core and step draws its own reproducible noise.
+
+    Args:
+        core_name (str): The name of the core.
+        core_data (dict): The config of the core, its "seed" is used if given.
+        step (str): The name of the step, e.g. noise_vertices.
+
+    Returns:
+        np.random.SeedSequence: The seed.
+    """
+    return np.random.SeedSequence([core_data.get("seed", 0), zlib.crc32(core_name.encode()), zlib.crc32(step.encode())])
+
+
+def _tetrahedron_triangles():
+    """
+    Build the triangles of each inside/outside case of a tetrahedron.
+
+    Returns:
+        dict: For each case code, with bit i set if corner i is inside, the triangles as triples of corner pairs.
+    """
+    table = {}
+    for code in range(16):
+        inside = [corner for corner in range(4) if code >> corner & 1]
+        outside = [corner for corner in range(4) if not code >> corner & 1]
+        if len(inside) in (1, 3):
+            single, others = (inside[0], outside) if len(inside) == 1 else (outside[0], inside)
+            table[code] = [[(single, other) for other in others]]
+        elif len(inside) == 2:
+            (a, b), (c, d) = inside, outside
+            table[code] = [[(a, c), (a, d), (b, d)], [(a, c), (b, d), (b, c)]]
+    return table
+
+
+TETRAHEDRON_TRIANGLES = _tetrahedron_triangles()
+
+
+def icosphere(subdivisions, radius=1.0):
+    """
+    Create an icosphere like Blender does, subdivisions=1 is the icosahedron.
+
+    Args:
+        subdivisions (int): The number of subdivisions.
+        radius (float): The radius.
+
+    Returns:
+        tuple: The vertices (n, 3) and the triangles (m, 3).
+    """
+    t = (1 + 5 ** 0.5) / 2
+    vertices = np.array([[-1, t, 0], [1, t, 0], [-1, -t, 0], [1, -t, 0], [0, -1, t], [0, 1, t],
+                         [0, -1, -t], [0, 1, -t], [t, 0, -1], [t, 0, 1], [-t, 0, -1], [-t, 0, 1]], dtype=np.float64)
+    faces = np.array([[0, 11, 5], [0, 5, 1], [0, 1, 7], [0, 7, 10], [0, 10, 11], [1, 5, 9], [5, 11, 4],
+                      [11, 10, 2], [10, 7, 6], [7, 1, 8], [3, 9, 4], [3, 4, 2], [3, 2, 6], [3, 6, 8],
+                      [3, 8, 9], [4, 9, 5], [2, 4, 11], [6, 2, 10], [8, 6, 7], [9, 8, 1]], dtype=np.int64)
+    for _ in range(subdivisions - 1):
+        edge_index, edges = _face_edges(faces, len(vertices))
+        vertices = np.concatenate([vertices, (vertices[edges[:, 0]] + vertices[edges[:, 1]]) / 2])
+        faces = _split_faces(faces, edge_index + len(vertices) - len(edges))
+    vertices /= np.linalg.norm(vertices, axis=1, keepdims=True)
+    return vertices * radius, faces
+
+
+def _face_edges(faces, vertex_count):
+    """
+    Find the unique edges of a triangle mesh.
+
+    Args:
+        faces (np.ndarray): The triangles (m, 3).
+        vertex_count (int): The number of vertices.
+
+    Returns:
+        tuple: The edge of each face side (m, 3), side i going from corner i to corner i+1, and the edges (e, 2).
+    """
+    sides = np.sort(faces[:, [[0, 1], [1, 2], [2, 0]]], axis=2)
+    keys, edge_index = np.unique(sides[..., 0] * vertex_count + sides[..., 1], return_inverse=True)
+    return edge_index.reshape(-1, 3), np.stack([keys // vertex_count, keys % vertex_count], axis=1)
+
+
+def _split_faces(faces, edge_vertices):
+    """
+    Split each triangle into four at the new vertices on its sides.
+
+    Args:
+        faces (np.ndarray): The triangles (m, 3).
+        edge_vertices (np.ndarray): The new vertex on each side of each face (m, 3).
+
+    Returns:
+        np.ndarray: The triangles (4m, 3).
+    """
+    a, b, c = faces.T
+    ab, bc, ca = edge_vertices.T
+    return np.concatenate([np.stack(corners, axis=1) for corners in
+                           ((a, ab, ca), (b, bc, ab), (c, ca, bc), (ab, bc, ca))])
+
+
+def euler_matrix(rotation):
+    """
+    Create the rotation matrix of Euler angles in Blender's XYZ order.
+
+    Args:
+        rotation (list): The rotation around the X, Y and Z axis in degrees.
+
+    Returns:
+        np.ndarray: The rotation matrix (3, 3).
+    """
+    x, y, z = np.radians(rotation)
+    rotation_x = np.array([[1, 0, 0], [0, np.cos(x), -np.sin(x)], [0, np.sin(x), np.cos(x)]])
+    rotation_y = np.array([[np.cos(y), 0, np.sin(y)], [0, 1, 0], [-np.sin(y), 0, np.cos(y)]])
+    rotation_z = np.array([[np.cos(z), -np.sin(z), 0], [np.sin(z), np.cos(z), 0], [0, 0, 1]])
+    return rotation_z @ rotation_y @ rotation_x
+
+
+def jitter(vertices, intensity, seed):
+    """
+    Move each coordinate by a uniform random value between 0 and the intensity, like the noise_vertices step in Blender.
+
+    Args:
+        vertices (np.ndarray): The vertices (n, 3).
+        intensity (float): The maximum offset.
+        seed (np.random.SeedSequence): The seed of the noise.
+
+    Returns:
+        np.ndarray: The moved vertices.
+    """
+    return vertices + np.random.default_rng(seed).random(vertices.shape) * intensity
+
+
+def vertex_normals(vertices, faces):
+    """
+    Compute the area weighted normal of each vertex.
+
+    Args:
+        vertices (np.ndarray): The vertices (n, 3).
+        faces (np.ndarray): The triangles (m, 3).
+
+    Returns:
+        np.ndarray: The unit normals (n, 3).
+    """
+    face_normals = np.cross(vertices[faces[:, 1]] - vertices[faces[:, 0]], vertices[faces[:, 2]] - vertices[faces[:, 0]])
+    normals = np.stack([np.bincount(faces.ravel(), weights=np.repeat(face_normals[:, axis], 3), minlength=len(vertices))
+                        for axis in range(3)], axis=1)
+    return normals / np.maximum(np.linalg.norm(normals, axis=1, keepdims=True), 1e-12)
+
+
+def value_noise(points, permutation, values):
+    """
+    Evaluate smooth value noise on an integer lattice.
+
+    Args:
+        points (np.ndarray): The points (n, 3).
+        permutation (np.ndarray): A permutation of 0 to 255 hashing the lattice points.
+        values (np.ndarray): The 256 random values of the lattice points.
+
+    Returns:
+        np.ndarray: The noise between 0 and 1 at each point.
+    """
+    cell = np.floor(points).astype(np.int64)
+    fraction = points - cell
+    smooth = fraction * fraction * (3 - 2 * fraction)
+    result = np.zeros(len(points))
+    for offset in CUBE_CORNERS:
+        corner = cell + offset
+        lattice_hash = permutation[(permutation[(permutation[corner[:, 0] & 255] + corner[:, 1]) & 255] + corner[:, 2]) & 255]
+        weight = np.prod(np.where(offset, smooth, 1 - smooth), axis=1)
+        result += weight * values[lattice_hash]
+    return result
+
+
+def fractal_noise(points, size, seed, octaves=4):
+    """
+    Evaluate fractal value noise, the sum of octaves of value noise with halving amplitude.
+
+    Args:
+        points (np.ndarray): The points (n, 3).
+        size (float): The size of the largest noise features.
+        seed (np.random.SeedSequence): The seed of the noise.
+        octaves (int): The number of octaves.
+
+    Returns:
+        np.ndarray: The noise between 0 and 1 at each point.
+    """
+    rng = np.random.default_rng(seed)
+    permutation = rng.permutation(256)
+    values = rng.random(256)
+    total = np.zeros(len(points))
+    amplitude_sum = 0
+    for octave in range(octaves):
+        amplitude = 0.5 ** octave
+        total += amplitude * value_noise(points / size * 2 ** octave, permutation, values)
+        amplitude_sum += amplitude
+    return total / amplitude_sum
+
+
+def displace(vertices, faces, strength, size, seed):
+    """
+    Displace the vertices along their normals by fractal noise, like Blender's displace modifier with a noise texture.
+
+    Args:
+        vertices (np.ndarray): The vertices (n, 3).
+        faces (np.ndarray): The triangles (m, 3).
+        strength (float): The strength of the displacement.
+        size (float): The size of the noise.
+        seed (np.random.SeedSequence): The seed of the noise.
+
+    Returns:
+        np.ndarray: The displaced vertices.
+    """
+    offsets = (fractal_noise(vertices, size, seed) - 0.5) * strength
+    return vertices + vertex_normals(vertices, faces) * offsets[:, np.newaxis]
+
+
+def loop_subdivide(vertices, faces, levels):
+    """
+    Smooth a closed triangle mesh with Loop subdivision.
+
+    Args:
+        vertices (np.ndarray): The vertices (n, 3).
+        faces (np.ndarray): The triangles (m, 3).
+        levels (int): The number of subdivision levels, each splits every triangle into four.
+
+    Returns:
+        tuple: The vertices and the triangles.
+    """
+    for _ in range(levels):
+        vertex_count = len(vertices)
+        edge_index, edges = _face_edges(faces, vertex_count)
+        edge_count = len(edges)
+
+        # New vertex on each edge from its end points and the opposite corners of its faces
+        opposite = faces[:, [2, 0, 1]]
+        face_count = np.bincount(edge_index.ravel(), minlength=edge_count)
+        opposite_sum = np.stack([np.bincount(edge_index.ravel(), weights=vertices[opposite.ravel(), axis], minlength=edge_count)
+                                 for axis in range(3)], axis=1)
+        midpoints = (vertices[edges[:, 0]] + vertices[edges[:, 1]]) / 2
+        edge_points = np.where((face_count >= 2)[:, np.newaxis],
+                               0.75 * midpoints + 0.25 * opposite_sum / np.maximum(face_count, 1)[:, np.newaxis],
+                               midpoints)
+
+        # Old vertices move towards their neighbors depending on their valence
+        ends = edges.ravel()
+        neighbors = edges[:, ::-1].ravel()
+        valence = np.bincount(ends, minlength=vertex_count)
+        neighbor_sum = np.stack([np.bincount(ends, weights=vertices[neighbors, axis], minlength=vertex_count)
+                                 for axis in range(3)], axis=1)
+        safe_valence = np.maximum(valence, 1)
+        beta = (0.625 - (0.375 + 0.25 * np.cos(2 * np.pi / safe_valence)) ** 2) / safe_valence
+        beta[valence == 0] = 0
+        moved = (1 - valence * beta)[:, np.newaxis] * vertices + beta[:, np.newaxis] * neighbor_sum
+
+        vertices = np.concatenate([moved, edge_points])
+        faces = _split_faces(faces, edge_index + vertex_count)
+    return vertices, faces
+
+
+def marching_tetrahedra(field, origin, spacing):
+    """
+    Extract the surface where the field is zero, the inside being negative.
+
+    Args:
+        field (np.ndarray): The field sampled on a grid (nx, ny, nz).
+        origin (np.ndarray): The position of the first grid point.
+        spacing (float): The distance of the grid points.
+
+    Returns:
+        tuple: The vertices (n, 3) and the outward facing triangles (m, 3).
+    """
+    shape = field.shape
+    # Points exactly on the surface would create duplicate vertices
+    values = np.where(field == 0, 1e-9, field).ravel()
+    inside = values < 0
+    grid_index = np.arange(values.size).reshape(shape)
+    corners = np.stack([grid_index[x:shape[0] - 1 + x, y:shape[1] - 1 + y, z:shape[2] - 1 + z].ravel()
+                        for x, y, z in CUBE_CORNERS], axis=1)
+    corners_inside = inside[corners]
+    corners = corners[corners_inside.any(axis=1) & ~corners_inside.all(axis=1)]
+    tetrahedra = corners[:, TETRAHEDRA].reshape(-1, 4)
+    codes = inside[tetrahedra] @ np.array([1, 2, 4, 8])
+
+    triangle_edges = []
+    for code, triangles in TETRAHEDRON_TRIANGLES.items():
+        selected = tetrahedra[codes == code]
+        for triangle in triangles:
+            triangle_edges.append(np.stack([np.sort(selected[:, [a, b]], axis=1) for a, b in triangle], axis=1))
+    triangle_edges = np.concatenate(triangle_edges)
+    keys, vertex_index = np.unique(triangle_edges[..., 0] * values.size + triangle_edges[..., 1], return_inverse=True)
+    faces = vertex_index.reshape(-1, 3)
+
+    start, end = keys // values.size, keys % values.size
+    start_position = np.stack(np.unravel_index(start, shape), axis=1) * spacing + origin
+    end_position = np.stack(np.unravel_index(end, shape), axis=1) * spacing + origin
+    t = values[start] / (values[start] - values[end])
+    vertices = start_position + t[:, np.newaxis] * (end_position - start_position)
+
+    # Orient the triangles along the direction from inside to outside of one of their edges
+    normals = np.cross(vertices[faces[:, 1]] - vertices[faces[:, 0]], vertices[faces[:, 2]] - vertices[faces[:, 0]])
+    first = faces[:, 0]
+    outward = np.where(inside[start[first]][:, np.newaxis], end_position[first] - start_position[first],
+                       start_position[first] - end_position[first])
+    flip = np.einsum("ij,ij->i", normals, outward) < 0
+    faces[flip] = faces[flip][:, ::-1]
+    return vertices, faces
+
+
+class Lobe:
+    """
+    A jittered icosphere lobe, shaped, rotated and translated like a core in Blender.
+    The lobe is star shaped around its center, its field compares the distance of a point from the center
+    with the radius of the lobe in the direction of the point, interpolated smoothly between the vertices.
+    """
+    def __init__(self, core_name, core_data):
+        """
+        Initialize the Lobe class.
+
+        Args:
+            core_name (str): The name of the core.
+            core_data (dict): The config of the core from the nucleus.json.
+        """
+        vertices, self.faces = icosphere(core_data["subdiv"], core_data["radius"])
+        vertices = vertices * np.asarray(core_data["shape"], dtype=np.float64)
+        self.vertices = jitter(vertices, core_data["noise_vertices"], core_seed(core_name, core_data, "noise_vertices"))
+        self.rotation = euler_matrix(core_data["rotation"])
+        self.translation = np.asarray(core_data["translation"], dtype=np.float64)
+        self.radii = np.linalg.norm(self.vertices, axis=1)
+        self.directions = self.vertices / self.radii[:, np.newaxis]
+        # The interpolation kernel is as wide as the angle between neighboring vertices
+        vertex_angle = 1.1 / 2 ** (core_data["subdiv"] - 1)
+        self.sharpness = 2 / vertex_angle ** 2
+
+    def world_vertices(self):
+        """
+        Returns:
+            np.ndarray: The vertices in world space (n, 3).
+        """
+        return self.vertices @ self.rotation.T + self.translation
+
+    def field(self, points):
+        """
+        Evaluate the field of the lobe, negative inside.
+
+        Args:
+            points (np.ndarray): The points in world space (n, 3).
+
+        Returns:
+            np.ndarray: The field at each point.
+        """
+        local = (points - self.translation) @ self.rotation
+        distance = np.maximum(np.linalg.norm(local, axis=1), 1e-12)
+        weights = np.exp(self.sharpness * ((local / distance[:, np.newaxis]) @ self.directions.T - 1))
+        radius = (weights @ self.radii) / weights.sum(axis=1)
+        return distance - radius
+
+
+class NucleusShapeEngine:
+    """
+    Generates nucleus meshes from the nucleus.json with NumPy only, without Blender operators.
+
+    The steps follow the Blender generation:
+
+    - every core is a jittered icosphere, shaped, rotated and translated
+    - the addons are merged into their cores as union of the lobe fields,
+      the surface is extracted with marching tetrahedra, which remeshes it evenly like the sharp remesh
+    - the vertices are jittered again and displaced by rough and fine fractal noise along their normals
+    - the mesh is smoothed by Loop subdivision
+
+    The result are plain vertex and triangle arrays, so nuclei can be generated in worker processes
+    and Blender only has to import the arrays.
+    """
+    def __init__(self, core_config):
+        """
+        Initialize the NucleusShapeEngine class.
+
+        Args:
+            core_config (dict): The nucleus config.
+        """
+        self.core_config = core_config
+
+    def generate(self):
+        """
+        Generate the meshes of all cores which are not merged into another core.
+
+        Returns:
+            dict: The vertices (n, 3) and triangles (m, 3) of each core, keyed by the core name.
+        """
+        cores = self.core_config["cores"]
+        lobes = {core_name: [core_name] for core_name in cores}
+        for merge_data in self.core_config["merge"]:
+            core_name, addon_name = merge_data["core"], merge_data["addon"]
+            if core_name in lobes and addon_name in lobes:
+                lobes[core_name] += lobes.pop(addon_name)
+            else:
+                logging.error(f"The merging of {core_name} and {addon_name} failed, check the nucleus.json")
+
+        meshes = {}
+        for core_name, lobe_names in lobes.items():
+            if "addon" in core_name:
+                continue
+            logging.info(f"Generating {core_name} from {lobe_names}...")
+            meshes[core_name] = self.generate_core(core_name, [Lobe(name, cores[name]) for name in lobe_names])
+        return meshes
+
+    def generate_core(self, core_name, lobes):
+        """
+        Merge the lobes of a core and apply the modifications of its config.
+
+        Args:
+            core_name (str): The name of the core.
+            lobes (list): The lobes of the core, the first one is the core itself.
+
+        Returns:
+            tuple: The vertices (n, 3) and triangles (m, 3).
+        """
+        core_data = self.core_config["cores"][core_name]
+        remesh = core_data.get("remesh", {"octree": 5, "scale": 0.9})
+        vertices, faces = self.merge(lobes, remesh["octree"], remesh["scale"])
+        if "noise_vertices_2" in core_data:
+            vertices = jitter(vertices, core_data["noise_vertices_2"], core_seed(core_name, core_data, "noise_vertices_2"))
+        for step in ("noise_displace_rough", "noise_displace_fine"):
+            if step in core_data:
+                vertices = displace(vertices, faces, core_data[step]["strength"], core_data[step]["size"],
+                                    core_seed(core_name, core_data, step))
+        return loop_subdivide(vertices, faces, core_data.get("subdiv2", 0))
+
+    def merge(self, lobes, octree, scale):
+        """
+        Merge lobes into one evenly meshed surface.
+
+        Args:
+            lobes (list): The lobes.
+            octree (int): The octree depth of the remesh, the grid has 2^octree / scale cells along its longest side.
+            scale (float): The scale of the remesh.
+
+        Returns:
+            tuple: The vertices (n, 3) and triangles (m, 3).
+        """
+        points = np.concatenate([lobe.world_vertices() for lobe in lobes])
+        lower, upper = points.min(axis=0), points.max(axis=0)
+        spacing = (upper - lower).max() / max(int(round(2 ** octree / scale)), 1)
+        # Keep empty cells around the lobes, so the surface is closed
+        origin = lower - 2 * spacing
+        grid_shape = tuple(np.ceil((upper - lower) / spacing).astype(int) + 5)
+        grid = np.stack(np.meshgrid(*[origin[axis] + np.arange(grid_shape[axis]) * spacing for axis in range(3)],
+                                    indexing="ij"), axis=-1).reshape(-1, 3)
+
+        field = np.empty(len(grid))
+        for start in range(0, len(grid), FIELD_CHUNK):
+            chunk = grid[start:start + FIELD_CHUNK]
+            field[start:start + FIELD_CHUNK] = np.min([lobe.field(chunk) for lobe in lobes], axis=0)
+        return marching_tetrahedra(field.reshape(grid_shape), origin, spacing)
+
+
+def mesh_arrays(vertices, faces):
+    """
+    Convert a triangle mesh into the arrays of the geometry cache, which Blender imports.
+
+    Args:
+        vertices (np.ndarray): The vertices (n, 3).
+        faces (np.ndarray): The triangles (m, 3).
+
+    Returns:
+        dict: The arrays of the mesh, see GeometryCache.
+    """
+    return {
+        "vertices": vertices.astype(np.float32),
+        "loop_vertices": faces.ravel().astype(np.int32),
+        "loop_starts": np.arange(0, faces.size, 3, dtype=np.int32),
+        "loop_totals": np.full(len(faces), 3, dtype=np.int32),
+        "matrix_world": np.eye(4, dtype=np.float32),
+    }
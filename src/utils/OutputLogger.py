@@ -79,12 +79,16 @@ class OutputLogger:
         """
         logging.info(f"Output is being logged to {self.log_file}")
         
-    def run_subprocess(self, command):
+    def run_subprocess(self, command, env=None):
         """
             Running a subprocess with the correct logging setup
 
             :param command: Defines the command to be executed by the subprocess
             :type: str
+            :param env: Environment of the subprocess, defaults to the environment of the current process
+            :type: dict
+            :return: Return code of the subprocess, None if the subprocess could not be run
+            :rtype: int
         """
         logging.info("Starting subprocess")
         print(f"Sub process: {command}")
@@ -99,6 +103,7 @@ class OutputLogger:
                 stdout=subprocess.PIPE,
                 stderr=subprocess.STDOUT,
                 text=True,  # This replaces universal_newlines=True in Python 3.7 and later
+                env=env,
                 # check=False,  # Allow the process to complete even if the return code is non-zero
             )
 
@@ -126,5 +131,7 @@ class OutputLogger:
 
             if process.returncode != 0:
                 logging.error(f"Subprocess failed with return code {process.returncode}")
+            return process.returncode
         except Exception as e:
             logging.error(f"Error occurred during subprocess execution: {e}")
+            return None
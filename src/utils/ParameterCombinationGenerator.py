@@ -1,5 +1,38 @@
 from itertools import product
 import logging
+import math
+import numpy as np
+
+# Primitive polynomials and initial direction numbers of the Sobol sequence (Joe and Kuo, new-joe-kuo-6.21201).
+# Each entry is (degree, polynomial coefficients, initial direction numbers) of one dimension after the first.
+SOBOL_DIRECTIONS = [
+    (1, 0, [1]),
+    (2, 1, [1, 3]),
+    (3, 1, [1, 3, 1]),
+    (3, 2, [1, 1, 1]),
+    (4, 1, [1, 1, 3, 3]),
+    (4, 4, [1, 3, 5, 13]),
+    (5, 2, [1, 1, 5, 5, 17]),
+    (5, 4, [1, 1, 5, 5, 5]),
+    (5, 7, [1, 1, 7, 11, 19]),
+    (5, 11, [1, 1, 5, 1, 1]),
+    (5, 13, [1, 1, 1, 3, 11]),
+    (5, 14, [1, 3, 5, 5, 31]),
+    (6, 1, [1, 3, 3, 9, 7, 49]),
+    (6, 13, [1, 1, 1, 15, 21, 21]),
+    (6, 16, [1, 3, 1, 13, 27, 49]),
+    (6, 19, [1, 1, 1, 15, 7, 5]),
+    (6, 22, [1, 3, 1, 15, 13, 25]),
+    (6, 25, [1, 1, 5, 5, 19, 61]),
+    (7, 1, [1, 3, 7, 11, 23, 15, 103]),
+    (7, 4, [1, 3, 7, 13, 13, 15, 69]),
+]
+SOBOL_BITS = 32
+# Fraction of an increment by which a range maximum may be missed and still be included
+RANGE_TOLERANCE = 1e-9
+SAMPLING_METHODS = ["random", "latin_hypercube", "sobol"]
+
+
 class ParameterCombinationGenerator:
     def __init__(self):
         logging.info("Creating all combination according to parameter range and increments...")
@@ -132,6 +165,145 @@ class ParameterCombinationGenerator:
 
         return recursive_list
         
+    def sample_parameter_combinations(self, parameter_ranges, increments, sample_count, method="random", seed=0):
+        """
+        Draw a fixed number of combinations from the grid defined by the given ranges and increments.
+
+        Instead of running every combination, each parameter is sampled independently on its grid values.
+        The samples are deterministic for a given seed. Supported methods are:
+
+        - random: uniform random samples
+        - latin_hypercube: every parameter covers its range in sample_count equally sized strata
+        - sobol: Sobol low discrepancy sequence with a random digital shift
+
+        Args:
+            parameter_ranges (dict): A dictionary containing the parameter ranges.
+            increments (dict): A dictionary containing the increments for each parameter.
+            sample_count (int): The number of combinations to draw.
+            method (str): The sampling method, one of SAMPLING_METHODS.
+            seed (int): The seed of the random number generator.
+
+        Yields:
+            dict: One combination of parameter values, structured like the ones of :func:`generate_parameter_combinations`.
+
+        Raises:
+            ValueError: If the sampling method is unknown.
+
+        """
+        axes = self._flatten_axes(parameter_ranges, increments)
+        rng = np.random.default_rng(seed)
+        if method == "random":
+            unit_samples = rng.random((sample_count, len(axes)))
+        elif method == "latin_hypercube":
+            strata = np.stack([rng.permutation(sample_count) for _ in axes], axis=1)
+            unit_samples = (strata + rng.random((sample_count, len(axes)))) / sample_count
+        elif method == "sobol":
+            unit_samples = self._sobol_samples(sample_count, len(axes), rng)
+        else:
+            raise ValueError(f"Unknown sampling method {method}, use one of {SAMPLING_METHODS}")
+        logging.info(f"Sampling {sample_count} combinations of {len(axes)} parameters with {method} sampling")
+
+        axis_lengths = np.array([len(values) for _, values in axes])
+        value_indices = np.minimum((unit_samples * axis_lengths).astype(np.int64), axis_lengths - 1)
+        # Look up the values of every sample at once, one column per parameter
+        columns = [values[value_indices[:, k]].tolist() for k, (_, values) in enumerate(axes)]
+        for sample in zip(*columns):
+            combination = {}
+            for (path, _), value in zip(axes, sample):
+                self._set_path_value(combination, path, value)
+            yield combination
+
+    def _flatten_axes(self, parameter_ranges, increments, path=()):
+        """
+        List every scalar parameter with its grid values.
+
+        The parameters of the current level come first, followed by the parameters of each nested level.
+        Every vector component is an axis of its own. Counting through the axes with the last axis changing
+        fastest gives the combinations in the order of :func:`generate_parameter_combinations`.
+
+        Args:
+            parameter_ranges (dict): A dictionary containing the parameter ranges.
+            increments (dict): A dictionary containing the increments for each parameter.
+            path (tuple): The keys leading to the current level.
+
+        Returns:
+            list: A list of tuples of the parameter path and its values as array. Vector components have their index as last path element.
+
+        """
+        first_layer_axes = []
+        nested_axes = []
+        for key, increment in increments.items():
+            if isinstance(increment, dict):
+                nested_axes += self._flatten_axes(parameter_ranges[key], increment, path + (key,))
+            elif isinstance(increment, list):
+                for i, value in enumerate(parameter_ranges[key]):
+                    first_layer_axes.append((path + (key, i), self.generate_axis(value, increment[i])))
+            else:
+                first_layer_axes.append((path + (key,), self.generate_axis(parameter_ranges[key], increment)))
+        return first_layer_axes + nested_axes
+
+    def _set_path_value(self, combination, path, value):
+        """
+        Set a value in a nested combination dictionary, creating missing levels and vectors on the way.
+
+        Args:
+            combination (dict): The combination to update.
+            path (tuple): The keys leading to the value. An integer last element addresses a vector component.
+            value: The value to set.
+
+        """
+        *parents, key = path
+        if isinstance(key, int):
+            *parents, vector_key = parents
+        target = combination
+        for parent in parents:
+            target = target.setdefault(parent, {})
+        if isinstance(key, int):
+            target.setdefault(vector_key, []).append(value)
+        else:
+            target[key] = value
+
+    def _sobol_samples(self, sample_count, dimensions, rng):
+        """
+        Create the first points of the Sobol sequence, randomized with a digital shift.
+
+        Args:
+            sample_count (int): The number of points.
+            dimensions (int): The number of dimensions.
+            rng (np.random.Generator): The random number generator for the digital shift.
+
+        Returns:
+            np.array: Points in the unit cube with shape (sample_count, dimensions).
+
+        Raises:
+            ValueError: If more dimensions are requested than direction numbers are available.
+
+        """
+        if dimensions > len(SOBOL_DIRECTIONS) + 1:
+            raise ValueError(f"Sobol sampling supports at most {len(SOBOL_DIRECTIONS) + 1} parameters, "
+                             f"got {dimensions}. Use latin_hypercube sampling instead")
+        directions = np.zeros((dimensions, SOBOL_BITS), dtype=np.uint64)
+        # The first dimension is the van der Corput sequence in base 2
+        directions[0] = [1 << (SOBOL_BITS - 1 - bit) for bit in range(SOBOL_BITS)]
+        for dimension in range(1, dimensions):
+            degree, coefficients, initial = SOBOL_DIRECTIONS[dimension - 1]
+            m = list(initial)
+            for bit in range(degree, SOBOL_BITS):
+                new_m = m[bit - degree] ^ (m[bit - degree] << degree)
+                for k in range(1, degree):
+                    if (coefficients >> (degree - 1 - k)) & 1:
+                        new_m ^= m[bit - k] << k
+                m.append(new_m)
+            directions[dimension] = [m[bit] << (SOBOL_BITS - 1 - bit) for bit in range(SOBOL_BITS)]
+
+        indices = np.arange(sample_count, dtype=np.uint64)
+        points = np.zeros((sample_count, dimensions), dtype=np.uint64)
+        for bit in range(SOBOL_BITS):
+            has_bit = ((indices >> np.uint64(bit)) & np.uint64(1)).astype(bool)
+            points[has_bit] ^= directions[:, bit]
+        shift = rng.integers(0, 1 << SOBOL_BITS, size=dimensions, dtype=np.uint64)
+        return (points ^ shift) / float(1 << SOBOL_BITS)
+
     def generate_values_from_range(self, param, increment):
         """
         Generate a list of values from a given range and increment.
@@ -144,23 +316,125 @@ class ParameterCombinationGenerator:
             list: A list of values.
 
         """
-        # Get the minimum and maximum values from the range
+        return self.generate_axis(param, increment).tolist()
+
+    def axis_length(self, param, increment):
+        """
+        Number of values of a range with the given increment. The maximum is included if it is
+        reached within RANGE_TOLERANCE increments, so float rounding does not change the sweep size.
+
+        Args:
+            param (dict): A dictionary containing the range of values.
+            increment (float): The increment value.
+
+        Returns:
+            int: The number of values.
+
+        """
         min_value = param.get('min', 0)
         max_value = param.get('max', 0)
-        current_value = min_value
-        values = []
-        # Generate values within the range
-        while current_value <= max_value:
-            values.append(current_value)
-            # If the current value is a dictionary, stop generating values
-            if isinstance(current_value, dict):
-                break
-            else:
-                # Increment the current value
-                current_value += increment
+        if max_value < min_value:
+            return 0
+        if increment <= 0:
+            logging.warning(f"Increment {increment} is not positive, only using the minimum of {param}")
+            return 1
+        return int(np.floor((max_value - min_value) / increment + RANGE_TOLERANCE)) + 1
+
+    def generate_axis(self, param, increment):
+        """
+        Generate the values of a given range and increment as array.
+
+        The values are computed from their index instead of summing up the increment,
+        so no rounding error accumulates. The array is an integer array if the range and increment are integers.
+
+        Args:
+            param (dict): A dictionary containing the range of values.
+            increment (float): The increment value.
+
+        Returns:
+            np.array: The values of the range.
+
+        """
+        min_value = param.get('min', 0)
+        max_value = param.get('max', 0)
+        count = self.axis_length(param, increment)
+        if all(isinstance(value, int) for value in (min_value, max_value, increment)):
+            return min_value + increment * np.arange(count, dtype=np.int64)
+        values = min_value + increment * np.arange(count, dtype=np.float64)
+        if count > 1 and abs(values[-1] - max_value) <= RANGE_TOLERANCE * increment:
+            values[-1] = max_value
         return values
 
 
+class CombinationSpace:
+    """
+    Index addressable space of all combinations of the given parameter ranges and increments.
+
+    Combination i is decoded directly from i by treating the parameter axes of
+    :func:`ParameterCombinationGenerator._flatten_axes` as digits of a mixed radix number,
+    so any slice of the space can be run without generating the combinations before it.
+    """
+    def __init__(self, parameter_ranges, increments):
+        """
+        Args:
+            parameter_ranges (dict): A dictionary containing the parameter ranges.
+            increments (dict): A dictionary containing the increments for each parameter.
+        """
+        self.generator = ParameterCombinationGenerator()
+        self.axes = self.generator._flatten_axes(parameter_ranges, increments)
+        self.size = math.prod(len(values) for _, values in self.axes)
+
+    def __len__(self):
+        return self.size
+
+    def combination_at(self, index):
+        """
+        Decode a single combination from its index.
+
+        Args:
+            index (int): The index of the combination.
+
+        Returns:
+            dict: The combination of parameter values.
+
+        Raises:
+            IndexError: If the index is outside of the combination space.
+
+        """
+        if not 0 <= index < self.size:
+            raise IndexError(f"Combination {index} is outside of the {self.size} combinations")
+        # The last axis changes fastest, so it is the least significant digit
+        value_indices = []
+        for _, values in reversed(self.axes):
+            index, value_index = divmod(index, len(values))
+            value_indices.append(value_index)
+        combination = {}
+        for (path, values), value_index in zip(self.axes, reversed(value_indices)):
+            self.generator._set_path_value(combination, path, values[value_index].item())
+        return combination
+
+    def shard(self, shard_index, shard_count):
+        """
+        Iterate over one of shard_count disjoint shards of the space.
+        The shard contains every shard_count-th combination, starting at shard_index,
+        so each shard covers the whole parameter range.
+
+        Args:
+            shard_index (int): The zero based index of the shard.
+            shard_count (int): The number of shards.
+
+        Returns:
+            iterator: The combination index and the combination of every combination in the shard.
+
+        Raises:
+            ValueError: If the shard index is not one of the shard_count shards.
+
+        """
+        if not 0 <= shard_index < shard_count:
+            raise ValueError(f"Shard index must be between 0 and {shard_count - 1}, got {shard_index}")
+        return ((index, self.combination_at(index)) for index in range(shard_index, self.size, shard_count))
+
+
 
 
 # Test cases for example dictionaries
@@ -0,0 +1,208 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import uuid
+
+# Linux ioctl request to clone the extents of a file (copy on write), see ioctl_ficlone(2)
+FICLONE = 0x40049409
+# Fraction of the maximum size a full cache is reduced to, so it is not scanned again on the next store
+EVICTION_TARGET = 0.9
+# Configs which define the rendered scene
+SCENE_CONFIGS = ("nucleus_config", "dustjet_config", "spacecraftAnimation_config", "render_configs")
+# Render settings which do not change a single rendered image
+EXECUTION_SETTINGS = ("render_cache", "render_worker", "scheduler", "start_frame", "end_frame", "render_layers")
+
+
+def scene_configs(paths):
+    """
+    Merge every config which defines the rendered scene, which the render cache keys are computed from.
+
+    Only the content of the configs is used, not their paths or the path of the blend file,
+    which differ for every job of a parallel sweep. The cache settings, the resource budget of the scheduler
+    and the frame and layer selection are removed, as they do not change a single rendered image.
+    The single pass mode is kept, as its layer images contain the light of the full scene.
+
+    Args:
+        paths (dict): The paths of the job.
+
+    Returns:
+        dict: The nucleus, dust jet, animation and render configs.
+    """
+    configs = {}
+    for config in SCENE_CONFIGS:
+        with open(paths[config]) as json_file:
+            configs[config] = json.load(json_file)
+    for key in EXECUTION_SETTINGS:
+        configs["render_configs"].pop(key, None)
+    return configs
+
+
+class RenderCache:
+    """
+    Content addressed cache of rendered images.
+
+    Each image is stored under the hash of everything which defines it: the configs of the scene, the layer and the frame.
+    Images are added to and restored from the cache as hard links, or as copy on write clones or copies where
+    hard links are not possible, so a cache hit costs no render and almost no storage.
+    The cache is limited in size and evicts the least recently used images first.
+    Its size is counted once and then kept as a running total, the cache is only scanned again when it is full.
+    """
+    def __init__(self, cache_dir, max_size_gb):
+        """
+        Initialize the RenderCache class.
+
+        Args:
+            cache_dir (str): The directory of the cache.
+            max_size_gb (float): The maximum size of the cache in gigabytes.
+        """
+        self.cache_dir = cache_dir
+        self.max_size = int(max_size_gb * 1024 ** 3)
+        os.makedirs(cache_dir, exist_ok=True)
+        self.total_size = sum(size for _, size, _ in self.scan())
+
+    def key(self, configs, layer, frame):
+        """
+        Compute the canonical key of a rendered image.
+
+        Args:
+            configs (dict): The merged configs defining the scene.
+            layer (str): The render layer of the image.
+            frame (int): The frame of the image.
+
+        Returns:
+            str: The hex digest identifying the image.
+        """
+        canonical = json.dumps({"configs": configs, "layer": layer, "frame": frame}, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def entry_path(self, key):
+        """
+        Get the path of a cache entry.
+
+        Args:
+            key (str): The key of the image.
+
+        Returns:
+            str: The path of the cached image.
+        """
+        return os.path.join(self.cache_dir, key[:2], f"{key}.png")
+
+    def restore(self, key, target_path):
+        """
+        Place a cached image at the target path if it is in the cache.
+
+        Args:
+            key (str): The key of the image.
+            target_path (str): The path the image should be placed at.
+
+        Returns:
+            bool: True on a cache hit.
+        """
+        entry = self.entry_path(key)
+        if not os.path.exists(entry):
+            return False
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        try:
+            self._place(entry, target_path)
+        except OSError as e:
+            logging.warning(f"Restoring {entry} failed: {e}")
+            return False
+        # Mark the entry as recently used for the eviction
+        os.utime(entry)
+        logging.info(f"Render cache hit: {target_path}")
+        return True
+
+    def store(self, key, source_path):
+        """
+        Add a rendered image to the cache and evict old images if the cache is too big.
+
+        Args:
+            key (str): The key of the image.
+            source_path (str): The path of the rendered image.
+        """
+        if not os.path.exists(source_path):
+            logging.warning(f"Rendered image {source_path} does not exist and is not cached")
+            return
+        entry = self.entry_path(key)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        # Place the image under a unique name first, so concurrent renders never see a partial entry
+        temp_entry = f"{entry}.{uuid.uuid4().hex}.tmp"
+        try:
+            replaced_size = os.path.getsize(entry) if os.path.exists(entry) else 0
+            self._place(source_path, temp_entry)
+            os.replace(temp_entry, entry)
+            self.total_size += os.path.getsize(entry) - replaced_size
+        except OSError as e:
+            logging.warning(f"Caching {source_path} failed: {e}")
+            if os.path.exists(temp_entry):
+                os.remove(temp_entry)
+            return
+        logging.info(f"Added {source_path} to render cache")
+        if self.total_size > self.max_size:
+            self.evict()
+
+    def scan(self):
+        """
+        List the images of the cache.
+
+        Returns:
+            list: The modification time, size and path of each image.
+        """
+        entries = []
+        for root, _, filenames in os.walk(self.cache_dir):
+            for filename in filenames:
+                if filename.endswith(".png"):
+                    path = os.path.join(root, filename)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        # Evicted by another job in the meantime
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self):
+        """
+        Remove the least recently used images until the cache fits into the eviction target of its maximum size.
+        The cache is scanned again, so images stored or evicted by other jobs are taken into account.
+        """
+        entries = self.scan()
+        self.total_size = sum(size for _, size, _ in entries)
+        if self.total_size <= self.max_size:
+            return
+        for _, size, path in sorted(entries):
+            try:
+                os.remove(path)
+                logging.info(f"Evicted {path} from render cache")
+            except FileNotFoundError:
+                pass
+            self.total_size -= size
+            if self.total_size <= self.max_size * EVICTION_TARGET:
+                break
+
+    def _place(self, source_path, target_path):
+        """
+        Make the file at source_path available at target_path without copying the data where possible.
+        Tries a hard link, then a copy on write clone, then falls back to a copy.
+
+        Args:
+            source_path (str): The existing file.
+            target_path (str): The path of the new file, which is replaced if it exists.
+        """
+        if os.path.exists(target_path):
+            os.remove(target_path)
+        try:
+            os.link(source_path, target_path)
+            return
+        except OSError:
+            pass
+        try:
+            import fcntl
+            with open(source_path, 'rb') as source, open(target_path, 'wb') as target:
+                fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+            return
+        except (ImportError, OSError):
+            pass
+        shutil.copyfile(source_path, target_path)
@@ -0,0 +1,253 @@
+import logging
+import os
+import subprocess
+import threading
+
+
+class ResourceProbe:
+    """
+    Base class of the resource probes used by the :class:`RenderScheduler`.
+    A probe reports the total capacity and the currently free amount of the resources it knows,
+    for example {"cpu": 16, "ram_mb": 64000}.
+    """
+    def capacity(self):
+        """
+        :return: Total amount of each resource
+        :rtype: dict
+        """
+        raise NotImplementedError
+
+    def free(self):
+        """
+        :return: Currently free amount of each resource, resources which cannot be measured are left out
+        :rtype: dict
+        """
+        raise NotImplementedError
+
+
+class ProcProbe(ResourceProbe):
+    """
+    Probes the CPU cores available to this process and the RAM of the system from /proc/meminfo.
+    On systems without /proc only the CPU cores are reported.
+    """
+    def capacity(self):
+        capacity = {"cpu": self.cpu_count()}
+        meminfo = self.read_meminfo()
+        if "MemTotal" in meminfo:
+            capacity["ram_mb"] = meminfo["MemTotal"]
+        return capacity
+
+    def free(self):
+        meminfo = self.read_meminfo()
+        if "MemAvailable" in meminfo:
+            return {"ram_mb": meminfo["MemAvailable"]}
+        return {}
+
+    def cpu_count(self):
+        """
+        :return: Number of CPU cores this process may run on
+        :rtype: int
+        """
+        if hasattr(os, "sched_getaffinity"):
+            return len(os.sched_getaffinity(0))
+        return os.cpu_count() or 1
+
+    def read_meminfo(self):
+        """
+        :return: Memory values of /proc/meminfo in megabytes, empty if it does not exist
+        :rtype: dict
+        """
+        meminfo = {}
+        try:
+            with open("/proc/meminfo", 'r') as file:
+                for line in file:
+                    key, value = line.split(":", 1)
+                    # Values are given in kB
+                    meminfo[key] = int(value.split()[0]) // 1024
+        except OSError:
+            pass
+        return meminfo
+
+
+class GpuProbe(ResourceProbe):
+    """
+    Probes the memory of all NVIDIA GPUs with nvidia-smi. Use :func:`available` to check for GPUs first.
+    """
+    def query(self, field):
+        """
+        :param field: The nvidia-smi memory field, e.g. memory.total
+        :type field: str
+        :return: Summed value of the field over all GPUs in megabytes
+        :rtype: int
+        """
+        result = subprocess.run(['nvidia-smi', f'--query-gpu={field}', '--format=csv,nounits,noheader'],
+                                stdout=subprocess.PIPE, universal_newlines=True, check=True)
+        return sum(int(x) for x in result.stdout.strip().split('\n'))
+
+    def available(self):
+        """
+        :return: True if nvidia-smi reports at least one GPU
+        :rtype: bool
+        """
+        try:
+            return self.query("memory.total") > 0
+        except (OSError, ValueError, subprocess.CalledProcessError):
+            return False
+
+    def capacity(self):
+        return {"gpu_mb": self.query("memory.total")}
+
+    def free(self):
+        try:
+            return {"gpu_mb": self.query("memory.free")}
+        except (OSError, ValueError, subprocess.CalledProcessError) as e:
+            logging.warning(f"Could not query GPU memory: {e}")
+            return {}
+
+
+class FakeProbe(ResourceProbe):
+    """
+    Probe with fixed values, used to test the scheduler without real hardware.
+    """
+    def __init__(self, capacity, free=None):
+        """
+        :param capacity: Total amount of each resource
+        :type capacity: dict
+        :param free: Free amount of each resource, defaults to the capacity
+        :type free: dict
+        """
+        self._capacity = capacity
+        self._free = free if free is not None else capacity
+
+    def capacity(self):
+        return dict(self._capacity)
+
+    def free(self):
+        return dict(self._free)
+
+
+class RenderScheduler:
+    """
+    Starts jobs as soon as the resources they need are available.
+
+    Every job demands a fixed amount of resources, for example {"cpu": 4, "gpu_mb": 6000}.
+    A job is admitted if the demands of all running jobs plus its own fit into the capacity reported by the probes
+    and its demand fits into the currently free amount, which covers resources used by other programs.
+    Resources no probe reports are not limited. When a job finishes, its resources are released and waiting jobs
+    are admitted immediately.
+    """
+    def __init__(self, probes, demand, max_jobs=0, recheck_interval=1.0):
+        """
+        :param probes: The probes reporting the available resources
+        :type probes: list[ResourceProbe]
+        :param demand: The resources a single job needs
+        :type demand: dict
+        :param max_jobs: Maximum number of jobs running at the same time, 0 for no limit
+        :type max_jobs: int
+        :param recheck_interval: Seconds after which the free resources are probed again while a job is waiting
+        :type recheck_interval: float
+        """
+        self.probes = probes
+        self.capacity = {}
+        for probe in probes:
+            self.capacity.update(probe.capacity())
+        # Only demands of resources which are probed can be limited
+        self.demand = {resource: amount for resource, amount in demand.items() if resource in self.capacity}
+        self.max_jobs = max_jobs
+        self.recheck_interval = recheck_interval
+        self.reserved = {resource: 0 for resource in self.demand}
+        self.running = 0
+        self.condition = threading.Condition()
+        logging.info(f"Scheduler capacity: {self.capacity}, demand per job: {self.demand}")
+
+    def free(self):
+        """
+        :return: Currently free amount of each resource over all probes
+        :rtype: dict
+        """
+        free = {}
+        for probe in self.probes:
+            free.update(probe.free())
+        return free
+
+    def can_admit(self):
+        """
+        Checks if another job fits into the available resources. Must be called while holding the condition.
+        A job is always admitted if nothing is running, so a job which demands more than the capacity still runs.
+
+        :return: True if the job can be started
+        :rtype: bool
+        """
+        if self.running == 0:
+            return True
+        if self.max_jobs and self.running >= self.max_jobs:
+            return False
+        free = self.free()
+        for resource, amount in self.demand.items():
+            if self.reserved[resource] + amount > self.capacity[resource]:
+                return False
+            if resource in free and amount > free[resource]:
+                return False
+        return True
+
+    def run(self, jobs, launch):
+        """
+        Runs all jobs and waits until they are finished.
+
+        :param jobs: The jobs to run
+        :type jobs: list
+        :param launch: Function starting a job and returning its subprocess.Popen
+        :type launch: function
+        :return: The jobs which finished with return code 0
+        :rtype: list
+        """
+        finished_jobs = []
+        waiters = []
+        for job in jobs:
+            with self.condition:
+                while not self.can_admit():
+                    logging.info(f"Waiting for resources, {self.running} jobs running...")
+                    self.condition.wait(self.recheck_interval)
+                self.running += 1
+                for resource, amount in self.demand.items():
+                    self.reserved[resource] += amount
+            try:
+                process = launch(job)
+            except Exception as e:
+                logging.error(f"Starting job {job} failed: {e}")
+                self._release()
+                continue
+            logging.info(f"There are {self.running} running.")
+            waiter = threading.Thread(target=self._wait_for_job, args=(process, job, finished_jobs))
+            waiter.start()
+            waiters.append(waiter)
+        for waiter in waiters:
+            waiter.join()
+        return finished_jobs
+
+    def _wait_for_job(self, process, job, finished_jobs):
+        """
+        Waits for a job to finish and releases its resources.
+
+        :param process: The subprocess of the job
+        :type process: subprocess.Popen
+        :param job: The job
+        :param finished_jobs: List of successful jobs, the job is appended if it succeeded
+        :type finished_jobs: list
+        """
+        process.wait()
+        if process.returncode == 0:
+            finished_jobs.append(job)
+        else:
+            logging.error(f"Job {job} failed with return code {process.returncode}")
+        self._release()
+
+    def _release(self):
+        """
+        Releases the resources of a finished job and wakes up the waiting jobs.
+        """
+        with self.condition:
+            self.running -= 1
+            for resource, amount in self.demand.items():
+                self.reserved[resource] -= amount
+            self.condition.notify_all()
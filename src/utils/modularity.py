@@ -1,8 +1,10 @@
 
 import importlib.util
 import sys
+import types
 import json
-with open('src/config/paths.json', 'r') as f:
+import os
+with open(os.environ.get('FLYBYGEN_PATHS', 'src/config/paths.json'), 'r') as f:
     paths = json.load(f)
 sys.path.append(paths['project_directory'])
 
@@ -25,6 +27,8 @@ class ModuleManager:
         """
         module_spec = importlib.util.spec_from_file_location(f"module.{self.module_name}", self.class_path)
         self.module = importlib.util.module_from_spec(module_spec)
+        # Register the parent package as well, so the classes of the module can be pickled, e.g. for process pools
+        sys.modules.setdefault("module", types.ModuleType("module"))
         sys.modules[f"module.{self.module_name}"] = self.module
         module_spec.loader.exec_module(self.module)
 
@@ -9,8 +9,7 @@ class SetUp:
             import psutil
             import cv2
             import PIL
-            # TODO: Add numpy to conda environment
-            # import numpy
+            import numpy
             logging.info(f"Loaded python libraries  successfully")
         except:
             logging.error(f"Failed to load. Installing python libraries...")
@@ -0,0 +1,32 @@
+import importlib
+import json
+import os
+import sys
+
+import pytest
+
+PROJECT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIRECTORY)
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    """
+    Create a project directory with its own paths.json and make it the working directory,
+    as the modules read their paths relative to it when they are imported.
+
+    Returns:
+        function: Writes the paths.json and imports a module of the project with it, e.g. project(paths, "src.utils.RenderCache").
+    """
+    monkeypatch.chdir(tmp_path)
+
+    def load(paths, module_name):
+        os.makedirs(tmp_path / "src" / "config", exist_ok=True)
+        with open(tmp_path / "src" / "config" / "paths.json", 'w') as file:
+            json.dump(dict(paths, project_directory=PROJECT_DIRECTORY), file)
+        # Modules of the project read the paths.json when they are imported, so they are imported again
+        for loaded_module in [name for name in sys.modules if name == "module" or name.startswith(("src.", "module."))]:
+            monkeypatch.delitem(sys.modules, loaded_module)
+        return importlib.import_module(module_name)
+
+    return load
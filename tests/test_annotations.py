@@ -0,0 +1,105 @@
+import os
+
+import numpy as np
+import pytest
+
+CONFIG_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src", "config")
+
+
+def reference_rle(mask):
+    pixels = mask.ravel(order="F")
+    counts = []
+    value = False
+    run = 0
+    for pixel in pixels:
+        if pixel != value:
+            counts.append(run)
+            value, run = pixel, 0
+        run += 1
+    counts.append(run)
+    return {"size": list(mask.shape), "counts": counts}
+
+
+def test_label_rles_match_per_mask_encoding(project, tmp_path):
+    module = project({
+        "dataset_cache": str(tmp_path) + "/",
+        "pipeline_version": "SetUp_",
+        "number_of_generation": "001/",
+        "mask_out": "mask/",
+        "mask_config": os.path.join(CONFIG_DIRECTORY, "PyPostProcessor", "mask_config.json"),
+        "render_configs": os.path.join(CONFIG_DIRECTORY, "blender", "render.json"),
+    }, "src.postProcessing.GroundTruthMask.MaskGen")
+    generator = module.MaskGenerator(process=False)
+    rng = np.random.default_rng(0)
+    labels = rng.integers(0, 6, (9, 7)) * (rng.random((9, 7)) < 0.5)
+    labels[-1, -1] = 5
+    labels[0, 0] = 0
+
+    rles = generator.encode_label_rles(labels, 7)
+    assert len(rles) == 7
+    for label in range(7):
+        assert rles[label] == reference_rle(labels == label)
+    assert generator.encode_rle(labels == 5) == reference_rle(labels == 5)
+    assert generator.encode_rle(np.ones((3, 2), dtype=bool)) == reference_rle(np.ones((3, 2), dtype=bool))
+
+
+def test_annotations_of_many_components(project, tmp_path):
+    module = project({
+        "dataset_cache": str(tmp_path) + "/",
+        "pipeline_version": "SetUp_",
+        "number_of_generation": "001/",
+        "mask_out": "mask/",
+        "mask_config": os.path.join(CONFIG_DIRECTORY, "PyPostProcessor", "mask_config.json"),
+        "render_configs": os.path.join(CONFIG_DIRECTORY, "blender", "render.json"),
+    }, "src.postProcessing.GroundTruthMask.MaskGen")
+    generator = module.MaskGenerator(process=False)
+    # A grid of single pixel specks, each one an instance
+    specks = np.zeros((40, 60), dtype=bool)
+    specks[::2, ::2] = True
+    annotations = generator.annotate_frame({"jets": specks})
+    assert len(annotations) == 600
+    for annotation in annotations:
+        x, y, width, height = annotation["bbox"]
+        assert (width, height, annotation["area"]) == (1, 1, 1)
+        mask = np.zeros_like(specks)
+        mask[y, x] = True
+        assert annotation["segmentation"] == reference_rle(mask)
+
+
+def test_compose_overlapping_masks(project, tmp_path):
+    module = project({
+        "dataset_cache": str(tmp_path) + "/",
+        "pipeline_version": "SetUp_",
+        "number_of_generation": "001/",
+        "mask_out": "mask/",
+        "mask_config": os.path.join(CONFIG_DIRECTORY, "PyPostProcessor", "mask_config.json"),
+        "render_configs": os.path.join(CONFIG_DIRECTORY, "blender", "render.json"),
+    }, "src.postProcessing.GroundTruthMask.MaskGen")
+    generator = module.MaskGenerator(process=False)
+    generator.mask_config["objects"] = {"nucleus": 50, "jets": 100}
+    nucleus = np.zeros((4, 6), dtype=bool)
+    nucleus[:, :4] = True
+    jets = np.zeros((4, 6), dtype=bool)
+    jets[1:3, 2:] = True
+    object_masks = {"nucleus": nucleus, "jets": jets}
+
+    # The first object of the priority list wins the overlapping pixels
+    generator.mask_config["composition"] = {"policy": "priority", "priority": ["jets", "nucleus"]}
+    labels = generator.compose_masks(object_masks)
+    expected = np.where(jets, 100, np.where(nucleus, 50, 0))
+    assert np.array_equal(labels, expected)
+    generator.mask_config["composition"] = {"policy": "priority", "priority": ["nucleus"]}
+    labels = generator.compose_masks(object_masks)
+    expected = np.where(nucleus, 50, np.where(jets, 100, 0))
+    assert np.array_equal(labels, expected)
+
+    # The bits follow the order of the objects, independent of the priority list
+    generator.mask_config["composition"] = {"policy": "bitmask", "priority": ["jets", "nucleus"]}
+    labels = generator.compose_masks(object_masks)
+    assert labels.dtype == np.uint8
+    assert np.array_equal(labels, nucleus * 1 | jets * 2)
+    assert labels[1, 3] == 3
+
+    generator.mask_config["composition"] = {"policy": "overwrite"}
+    with pytest.raises(ValueError):
+        generator.compose_masks(object_masks)
@@ -0,0 +1,54 @@
+import json
+import os
+import threading
+
+
+class FakeOutputLogging:
+    """
+    Records the paths of the jobs instead of running them.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.render_files = []
+
+    def run_subprocess(self, cmd, env):
+        with open(env["FLYBYGEN_PATHS"]) as file:
+            job_paths = json.load(file)
+        with self.lock:
+            self.render_files.append(job_paths["render_file"])
+        return 0
+
+
+def test_parallel_jobs_render_their_own_blend_files(project, tmp_path):
+    with open(tmp_path / "render.json", 'w') as file:
+        json.dump({"start_frame": 1, "end_frame": 1, "render_layers": ["all"]}, file)
+    with open(tmp_path / "nucleus.json", 'w') as file:
+        json.dump({"cores": {"core": {"radius": 1.0}}}, file)
+    paths = {
+        "cache_dir": "cache/",
+        "pipeline_version": "SetUp_",
+        "number_of_generation": "001",
+        "render_file": "cache/SetUp_001/SpacecraftMotion.blend",
+        "render_cache_dir": "cache/render_cache/",
+        "scene_file": "cache/SetUp_001/Scene.blend",
+        "dataset_cache": str(tmp_path / "dataset") + "/",
+        "render_configs": str(tmp_path / "render.json"),
+        "nucleus_config": str(tmp_path / "nucleus.json"),
+    }
+    module = project(paths, "src.utils.JsonParameterHandler")
+    output_logging = FakeOutputLogging()
+    updater = module.JsonParameterUpdater(paths["nucleus_config"], None, None, output_logging)
+    updater.combination_count = 2
+    updates = [(0, {"cores": {"core": {"radius": 1.0}}}), (1, {"cores": {"core": {"radius": 2.0}}})]
+    updater.run_parameter_combinations_parallel(iter(updates), {"cores": {"core": {"radius": 1.0}}}, "blender", 2)
+
+    render_files = output_logging.render_files
+    assert len(render_files) == 2
+    assert len(set(render_files)) == 2
+    for combination in ("comb_0", "comb_1"):
+        job_dir = os.path.join("cache", "SetUp_001", "configs", combination)
+        with open(os.path.join(job_dir, "paths.json")) as file:
+            job_paths = json.load(file)
+        assert job_paths["render_file"] == os.path.join(job_dir, "SetUp_001", "SpacecraftMotion.blend")
+        assert job_paths["scene_file"] == os.path.join(job_dir, "SetUp_001", "Scene.blend")
+        assert job_paths["render_cache_dir"] == paths["render_cache_dir"]
@@ -0,0 +1,83 @@
+import json
+import os
+
+from src.utils.CombinationLedger import CombinationLedger
+
+
+def write_file(path, content=b"image"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as file:
+        file.write(content)
+
+
+def test_post_processing_output_keeps_combination_completed(tmp_path):
+    output_dir = str(tmp_path / "comb_0")
+    write_file(os.path.join(output_dir, "all", "frame_0018.png"))
+    write_file(os.path.join(output_dir, "nucleus", "frame_0018.png"))
+    ledger = CombinationLedger(str(tmp_path / "ledger.jsonl"), ["all", "nucleus"])
+    ledger.record("comb_0", "completed", {"radius": 1.0}, output_dir)
+
+    write_file(os.path.join(output_dir, "noise_gaussian", "frame_0018.png"))
+    write_file(os.path.join(output_dir, "all_noise_gaussian", "frame_0018.png"))
+    restarted_ledger = CombinationLedger(str(tmp_path / "ledger.jsonl"), ["all", "nucleus"])
+    assert restarted_ledger.is_completed("comb_0", {"radius": 1.0}, output_dir)
+
+    write_file(os.path.join(output_dir, "all", "frame_0018.png"), b"changed image")
+    assert not restarted_ledger.is_completed("comb_0", {"radius": 1.0}, output_dir)
+
+
+class RenderingOutputLogging:
+    """
+    Renders fake images for the jobs instead of running blender.
+    """
+    def __init__(self, failing=(), partial=()):
+        self.failing = failing
+        self.partial = partial
+        self.rendered = []
+
+    def run_subprocess(self, cmd, env):
+        with open(env["FLYBYGEN_PATHS"]) as file:
+            job_paths = json.load(file)
+        combination = job_paths["combination"]
+        self.rendered.append(combination)
+        if combination in self.failing:
+            return 1
+        output_dir = os.path.join(job_paths["dataset_cache"] + job_paths["pipeline_version"] + job_paths["number_of_generation"], combination)
+        layers = ["all"] if combination in self.partial else ["all", "nucleus"]
+        for layer in layers:
+            write_file(os.path.join(output_dir, layer, "frame_0001.png"), combination.encode())
+        return 0
+
+
+def run_sweep(module, paths, output_logging):
+    updater = module.JsonParameterUpdater(paths["nucleus_config"], None, None, output_logging)
+    updater.combination_count = 3
+    updates = [(i, {"cores": {"core": {"radius": float(i)}}}) for i in range(3)]
+    updater.run_parameter_combinations_parallel(iter(updates), {"cores": {"core": {"radius": 1.0}}}, "blender", 2)
+    return sorted(output_logging.rendered)
+
+
+def test_resume_skips_completed_and_reruns_failed_combinations(project, tmp_path):
+    with open(tmp_path / "render.json", 'w') as file:
+        json.dump({"start_frame": 1, "end_frame": 1, "render_layers": {"all": "all", "nucleus": "AsteroidSurface.001"}}, file)
+    with open(tmp_path / "nucleus.json", 'w') as file:
+        json.dump({"cores": {"core": {"radius": 1.0}}}, file)
+    paths = {
+        "cache_dir": "cache/",
+        "pipeline_version": "SetUp_",
+        "number_of_generation": "001",
+        "render_file": "cache/SetUp_001/SpacecraftMotion.blend",
+        "dataset_cache": str(tmp_path / "dataset") + "/",
+        "render_configs": str(tmp_path / "render.json"),
+        "nucleus_config": str(tmp_path / "nucleus.json"),
+    }
+    module = project(paths, "src.utils.JsonParameterHandler")
+    assert run_sweep(module, paths, RenderingOutputLogging(failing=["comb_1"], partial=["comb_2"])) == ["comb_0", "comb_1", "comb_2"]
+
+    # A restarted sweep only runs the failed and the partially rendered combination
+    assert run_sweep(module, paths, RenderingOutputLogging()) == ["comb_1", "comb_2"]
+    assert run_sweep(module, paths, RenderingOutputLogging()) == []
+
+    # Changed pixels are detected by the checksum, even if the file size stays the same
+    write_file(str(tmp_path / "dataset" / "SetUp_001" / "comb_0" / "all" / "frame_0001.png"), b"COMB_0")
+    assert run_sweep(module, paths, RenderingOutputLogging()) == ["comb_0"]
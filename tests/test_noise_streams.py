@@ -0,0 +1,95 @@
+import json
+import os
+
+import cv2
+import numpy as np
+
+CONFIG_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src", "config")
+
+
+def create_dataset(tmp_path, sensor=False):
+    dataset = tmp_path / "dataset" / "SetUp_001"
+    os.makedirs(dataset / "comb_0" / "all")
+    rng = np.random.default_rng(0)
+    # Non square frame, 64 pixels wide and 48 pixels high
+    frame = rng.integers(0, 255, (48, 64, 4), dtype=np.uint8)
+    cv2.imwrite(str(dataset / "comb_0" / "all" / "frame_0001.png"), frame)
+
+    with open(os.path.join(CONFIG_DIRECTORY, "PyPostProcessor", "noise.json")) as file:
+        noise_config = json.load(file)
+    noise_config["sensor"]["enabled"] = sensor
+    noise_config["executor"] = {"backend": "serial", "batch_size": 1}
+    with open(tmp_path / "noise.json", 'w') as file:
+        json.dump(noise_config, file)
+    with open(tmp_path / "pipeline.json", 'w') as file:
+        json.dump({"stages": ["noise"], "readers": 1, "workers": 2, "writers": 2}, file)
+    return dataset, {
+        "dataset_cache": str(tmp_path / "dataset") + "/",
+        "pipeline_version": "SetUp_",
+        "number_of_generation": "001/",
+        "post_processing_basis": "comb_0/all/",
+        "noise_output": "noise",
+        "mask_out": "mask/",
+        "noise_config": str(tmp_path / "noise.json"),
+        "mask_config": os.path.join(CONFIG_DIRECTORY, "PyPostProcessor", "mask_config.json"),
+        "render_configs": os.path.join(CONFIG_DIRECTORY, "blender", "render.json"),
+        "pipeline_config": str(tmp_path / "pipeline.json"),
+    }
+
+
+def read(path):
+    return cv2.imread(str(path), cv2.IMREAD_UNCHANGED)
+
+
+def test_pipeline_noise_of_non_square_frames_matches_noise_generator(project, tmp_path):
+    dataset, paths = create_dataset(tmp_path, sensor=True)
+    pipeline = project(paths, "src.postProcessing.PostPipeline").PostPipeline()
+    assert pipeline.failures == []
+    pipeline_outputs = sorted(path.relative_to(dataset / "comb_0") for path in (dataset / "comb_0").glob("*/*.png")
+                              if path.parent.name != "all")
+    assert len(pipeline_outputs) == 6
+
+    project(paths, "src.postProcessing.Noise.NoiseGen_basic").BasicNoiseGenerator()
+    for output in pipeline_outputs:
+        pipeline_image = read(dataset / "comb_0" / output)
+        assert pipeline_image.shape[:2] == (48, 64)
+        assert np.array_equal(pipeline_image, read(dataset / output))
+
+
+def test_augmentation_matches_pipeline_noise(project, tmp_path):
+    dataset, paths = create_dataset(tmp_path)
+    project(paths, "src.postProcessing.PostPipeline").PostPipeline()
+    module = project(paths, "src.postProcessing.Noise.NoiseGen_basic")
+    for noisy_image, image_filename, combination_name in module.NoiseAugmentation():
+        stored_image = read(dataset / "comb_0" / f"all_noise_{combination_name}" / image_filename)
+        stored_image = stored_image[..., :3].astype(np.float32) * np.float32(255 / 65535)
+        assert np.allclose(noisy_image, stored_image, atol=255 / 65535)
+
+
+def test_mixed_noises_match_their_direct_sums(project, tmp_path):
+    _, paths = create_dataset(tmp_path)
+    generator = project(paths, "src.postProcessing.Noise.NoiseGen_basic").BasicNoiseGenerator(process=False)
+    rng = np.random.default_rng(2)
+    image = rng.uniform(0, 255, (48, 64, 3)).astype(np.float32)
+    # Large noises, so sums of several noises leave the 8 bit range before they come back into it
+    noise_types = ["sp", "gauss", "poisson", "speckle", "blur"]
+    noise_list = [(rng.normal(0, 120, image.shape).astype(np.float32), noise_type) for noise_type in noise_types]
+
+    noisy_images = generator.mix_noises(image, noise_list)
+    assert len(noisy_images) == 2 ** len(noise_types) - 1
+    derived = [(noisy_image, name) for noisy_image, name in noisy_images if name.count("_") >= 3]
+    assert len(derived) == 16
+    for noisy_image, name in derived:
+        subset = name.split("_")[1:]
+        direct = image.copy()
+        for noise, noise_type in noise_list:
+            if noise_type in subset:
+                direct += noise
+        assert noisy_image.dtype == np.float32
+        np.testing.assert_allclose(noisy_image, np.clip(direct, 0, 255), rtol=0, atol=1e-3)
+
+    # The order of a requested combination does not change its sum or its name
+    (reversed_image, reversed_name), = generator.mix_noises(image, noise_list, [("blur", "poisson", "sp")])
+    assert reversed_name == "_sp_poisson_blur"
+    np.testing.assert_allclose(reversed_image, dict((name, noisy) for noisy, name in noisy_images)["_sp_poisson_blur"],
+                               rtol=0, atol=1e-3)
@@ -0,0 +1,91 @@
+import copy
+import json
+import os
+
+import numpy as np
+import pytest
+
+from src.utils.NucleusShapeEngine import NucleusShapeEngine, icosphere, loop_subdivide, mesh_arrays
+
+NUCLEUS_CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                              "src", "config", "blender", "nucleus.json")
+
+
+@pytest.fixture
+def core_config():
+    with open(NUCLEUS_CONFIG) as json_file:
+        return json.load(json_file)
+
+
+def assert_closed_oriented_manifold(vertices, faces):
+    """
+    Every edge is used by exactly two faces in opposite directions and the faces point outwards.
+    """
+    half_edges = np.concatenate([faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]]])
+    keys = half_edges[:, 0] * len(vertices) + half_edges[:, 1]
+    reverse_keys = half_edges[:, 1] * len(vertices) + half_edges[:, 0]
+    assert len(np.unique(keys)) == len(keys)
+    assert np.array_equal(np.sort(keys), np.sort(reverse_keys))
+    assert np.array_equal(np.unique(faces), np.arange(len(vertices)))
+    volume = np.einsum("ij,ij->i", vertices[faces[:, 0]], np.cross(vertices[faces[:, 1]], vertices[faces[:, 2]])).sum() / 6
+    assert volume > 0
+
+
+@pytest.mark.parametrize("subdivisions", [1, 2, 3, 4])
+def test_icosphere_counts(subdivisions):
+    vertices, faces = icosphere(subdivisions, radius=2.0)
+    assert vertices.shape == (10 * 4 ** (subdivisions - 1) + 2, 3)
+    assert faces.shape == (20 * 4 ** (subdivisions - 1), 3)
+    assert np.allclose(np.linalg.norm(vertices, axis=1), 2.0)
+    assert_closed_oriented_manifold(vertices, faces)
+
+
+@pytest.mark.parametrize("levels", [0, 1, 2])
+def test_loop_subdivision_counts(levels):
+    vertices, faces = icosphere(2)
+    edge_count = len(faces) * 3 // 2
+    subdivided_vertices, subdivided_faces = loop_subdivide(vertices, faces, levels)
+    # Every level adds a vertex per edge and splits every face into four, the surface stays a sphere
+    assert len(subdivided_faces) == len(faces) * 4 ** levels
+    assert len(subdivided_vertices) - len(subdivided_faces) * 3 // 2 + len(subdivided_faces) == 2
+    if levels == 1:
+        assert len(subdivided_vertices) == len(vertices) + edge_count
+    assert_closed_oriented_manifold(subdivided_vertices, subdivided_faces)
+
+
+def test_generated_nucleus_is_closed_oriented_manifold(core_config):
+    meshes = NucleusShapeEngine(core_config).generate()
+    # Addons are merged into their core
+    assert list(meshes) == ["core"]
+    vertices, faces = meshes["core"]
+    assert_closed_oriented_manifold(vertices, faces)
+    # The lobes of the default config do not touch, so the nucleus has two surfaces
+    assert len(vertices) - len(faces) * 3 // 2 + len(faces) == 4
+
+
+def test_overlapping_lobes_merge_into_one_surface(core_config):
+    core_config["cores"]["addon1"]["translation"] = [0.5, 2.5, 0.5]
+    vertices, faces = NucleusShapeEngine(core_config).generate()["core"]
+    assert_closed_oriented_manifold(vertices, faces)
+    assert len(vertices) - len(faces) * 3 // 2 + len(faces) == 2
+
+
+def test_same_seed_gives_same_nucleus(core_config):
+    vertices, faces = NucleusShapeEngine(core_config).generate()["core"]
+    same_vertices, same_faces = NucleusShapeEngine(copy.deepcopy(core_config)).generate()["core"]
+    assert np.array_equal(vertices, same_vertices)
+    assert np.array_equal(faces, same_faces)
+
+    core_config["cores"]["core"]["seed"] += 1
+    other_vertices, _ = NucleusShapeEngine(core_config).generate()["core"]
+    assert other_vertices.shape != vertices.shape or not np.array_equal(other_vertices, vertices)
+
+
+def test_mesh_arrays_describe_triangles():
+    vertices, faces = icosphere(2)
+    arrays = mesh_arrays(vertices, faces)
+    assert arrays["vertices"].dtype == np.float32
+    assert np.array_equal(arrays["loop_vertices"].reshape(-1, 3), faces)
+    assert np.array_equal(arrays["loop_starts"], np.arange(len(faces)) * 3)
+    assert np.all(arrays["loop_totals"] == 3)
+    assert np.array_equal(arrays["matrix_world"], np.eye(4))
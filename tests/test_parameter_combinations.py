@@ -0,0 +1,175 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from src.utils.ParameterCombinationGenerator import CombinationSpace, ParameterCombinationGenerator, SAMPLING_METHODS, SOBOL_BITS
+
+PROJECT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PARAMETER_RANGES = {
+    "fps": {"min": 0, "max": 9},
+    "core": {
+        "radius": {"min": 0.0, "max": 0.9},
+        "rotation": [{"min": 0, "max": 9}, {"min": 10, "max": 19}, {"min": 20, "max": 29}],
+    },
+}
+INCREMENTS = {
+    "fps": 1,
+    "core": {"radius": 0.1, "rotation": [1, 1, 1]},
+}
+
+
+def sample(sample_count, method, seed=0):
+    generator = ParameterCombinationGenerator()
+    return list(generator.sample_parameter_combinations(PARAMETER_RANGES, INCREMENTS, sample_count, method, seed))
+
+
+@pytest.mark.parametrize("method", SAMPLING_METHODS)
+def test_samples_are_reproduced_by_their_seed(method):
+    assert sample(10, method, seed=3) == sample(10, method, seed=3)
+    assert sample(10, method, seed=3) != sample(10, method, seed=4)
+
+
+def test_latin_hypercube_samples_every_stratum_once():
+    # Each axis has ten values, so with ten samples every value is the stratum of exactly one sample
+    samples = sample(10, "latin_hypercube", seed=1)
+    assert sorted(combination["fps"] for combination in samples) == list(range(10))
+    assert sorted(combination["core"]["radius"] for combination in samples) == pytest.approx(np.arange(10) / 10)
+    for i in range(3):
+        assert sorted(combination["core"]["rotation"][i] for combination in samples) == list(range(10 * i, 10 * i + 10))
+
+
+def test_vector_components_keep_their_order():
+    for method in SAMPLING_METHODS:
+        for combination in sample(10, method):
+            rotation = combination["core"]["rotation"]
+            assert len(rotation) == 3
+            assert [value // 10 for value in rotation] == [0, 1, 2]
+
+    generator = ParameterCombinationGenerator()
+    combination = {}
+    for path, value in [(("core", "rotation", 0), 1), (("core", "radius"), 2.0), (("core", "rotation", 1), 3), (("fps",), 4)]:
+        generator._set_path_value(combination, path, value)
+    assert combination == {"core": {"rotation": [1, 3], "radius": 2.0}, "fps": 4}
+
+
+def test_sobol_points_of_the_first_dimensions():
+    generator = ParameterCombinationGenerator()
+    points = generator._sobol_samples(8, 3, np.random.default_rng(5))
+    # Remove the digital shift, which is drawn first from the generator
+    shift = np.random.default_rng(5).integers(0, 1 << SOBOL_BITS, size=3, dtype=np.uint64)
+    scale = float(1 << SOBOL_BITS)
+    unshifted = ((points * scale).astype(np.uint64) ^ shift) / scale
+    expected = np.array([
+        [0.0, 0.0, 0.0],
+        [0.5, 0.5, 0.5],
+        [0.25, 0.75, 0.75],
+        [0.75, 0.25, 0.25],
+        [0.125, 0.625, 0.375],
+        [0.625, 0.125, 0.875],
+        [0.375, 0.375, 0.625],
+        [0.875, 0.875, 0.125],
+    ])
+    assert np.array_equal(unshifted, expected)
+
+
+def test_sobol_rejects_too_many_dimensions():
+    generator = ParameterCombinationGenerator()
+    with pytest.raises(ValueError):
+        generator._sobol_samples(4, 100, np.random.default_rng(0))
+
+
+def test_unknown_sampling_method_raises():
+    with pytest.raises(ValueError):
+        sample(4, "grid")
+
+
+GRID_RANGES = {
+    "fps": {"min": 22, "max": 24},
+    "rotation_parameters": {"B2_main_rotation": {"period": {"min": 3, "max": 4}}},
+    "core": {
+        "radius": {"min": 1.0, "max": 2.0},
+        "rotation": [{"min": 0.0, "max": 0.5}, {"min": 1.0, "max": 1.5}],
+    },
+}
+GRID_INCREMENTS = {
+    "fps": 1,
+    "rotation_parameters": {"B2_main_rotation": {"period": 1}},
+    "core": {"radius": 0.5, "rotation": [0.5, 0.5]},
+}
+
+
+def test_combination_at_matches_the_generated_combinations():
+    combinations = ParameterCombinationGenerator().generate_parameter_combinations(GRID_RANGES, GRID_INCREMENTS)
+    space = CombinationSpace(GRID_RANGES, GRID_INCREMENTS)
+    assert len(space) == len(combinations) == 3 * 2 * 3 * 2 * 2
+    assert [space.combination_at(i) for i in range(len(space))] == combinations
+    with pytest.raises(IndexError):
+        space.combination_at(len(space))
+
+
+@pytest.mark.parametrize("shard_count", [1, 2, 5, 100])
+def test_shards_cover_every_combination_once(shard_count):
+    space = CombinationSpace(GRID_RANGES, GRID_INCREMENTS)
+    sharded = [entry for shard_index in range(shard_count) for entry in space.shard(shard_index, shard_count)]
+    # The combinations keep their index in the whole space, so comb_i names the same combination in every shard
+    assert sorted(index for index, _ in sharded) == list(range(len(space)))
+    assert all(combination == space.combination_at(index) for index, combination in sharded)
+
+
+@pytest.mark.parametrize("shard_index, shard_count", [(-1, 3), (3, 3), (0, 0)])
+def test_invalid_shard_raises(shard_index, shard_count):
+    with pytest.raises(ValueError):
+        CombinationSpace(GRID_RANGES, GRID_INCREMENTS).shard(shard_index, shard_count)
+
+
+@pytest.mark.parametrize("shard", ["0/3", "4/3", "a/b", "1", "1/2/3"])
+def test_malformed_shard_argument_is_a_usage_error(tmp_path, shard):
+    # The shard is parsed before anything is set up, so the pipeline does not start
+    result = subprocess.run([sys.executable, os.path.join(PROJECT_DIRECTORY, "FlyByGen.py"), "--shard", shard],
+                            cwd=tmp_path, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 2
+    assert "error: argument --shard" in result.stderr
+    assert "Traceback" not in result.stderr
+
+
+def test_drifting_float_range_includes_its_maximum_once():
+    generator = ParameterCombinationGenerator()
+    # Summing up 0.1 ten times gives 0.9999999999999999, which would drop or repeat the maximum
+    assert sum([0.1] * 10) != 1.0
+    param = {"min": 0.0, "max": 1.0}
+    values = generator.generate_axis(param, 0.1)
+    assert generator.axis_length(param, 0.1) == len(values) == 11
+    assert values[-1] == 1.0
+    assert np.count_nonzero(np.isclose(values, 1.0)) == 1
+    assert np.array_equal(values[:-1], 0.0 + np.arange(10) * 0.1)
+    assert generator.generate_values_from_range(param, 0.1) == values.tolist()
+
+
+def test_axis_values_are_computed_from_their_index():
+    generator = ParameterCombinationGenerator()
+    values = generator.generate_axis({"min": -1230, "max": -1110}, 10)
+    assert values.dtype == np.int64
+    assert values.tolist() == [-1230 + i * 10 for i in range(13)]
+    values = generator.generate_axis({"min": 0.3, "max": 2.0}, 0.7)
+    assert values.tolist() == [0.3 + i * 0.7 for i in range(3)]
+    # The tolerance is a fraction of the increment, a maximum missed by more is not included
+    param = {"min": 0.0, "max": 1.0 - 0.1 * 1e-6}
+    assert generator.axis_length(param, 0.1) == 10
+
+
+@pytest.mark.parametrize("increment", [0, 0.0, -0.5])
+def test_non_positive_increment_only_uses_the_minimum(increment):
+    generator = ParameterCombinationGenerator()
+    param = {"min": 1.5, "max": 2.5}
+    assert generator.axis_length(param, increment) == 1
+    assert generator.generate_axis(param, increment).tolist() == [1.5]
+
+
+def test_empty_range_has_no_values():
+    generator = ParameterCombinationGenerator()
+    assert generator.axis_length({"min": 2, "max": 1}, 1) == 0
+    assert generator.generate_axis({"min": 2, "max": 1}, 1).tolist() == []
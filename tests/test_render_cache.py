@@ -0,0 +1,92 @@
+import json
+import os
+
+from src.utils import RenderCache as render_cache_module
+from src.utils.RenderCache import RenderCache, scene_configs
+
+
+def write_render(path, size):
+    with open(path, 'wb') as file:
+        file.write(b"x" * size)
+    return str(path)
+
+
+def test_store_scans_the_cache_only_when_it_is_full(tmp_path, monkeypatch):
+    cache = RenderCache(str(tmp_path / "cache"), 1)
+    cache.max_size = 1000
+    scans = []
+    scan = RenderCache.scan
+    monkeypatch.setattr(RenderCache, "scan", lambda self: scans.append(1) or scan(self))
+
+    keys = [cache.key({"scene": 1}, "all", frame) for frame in range(12)]
+    for frame, key in enumerate(keys):
+        os.utime(write_render(tmp_path / f"frame_{frame}.png", 100), (frame, frame))
+        cache.store(key, str(tmp_path / f"frame_{frame}.png"))
+        os.utime(cache.entry_path(key), (frame, frame))
+        if frame < 10:
+            assert cache.total_size == 100 * (frame + 1)
+    # The eleventh image overflows the cache, which is reduced to the eviction target of 900 bytes,
+    # so the twelfth image fits without another scan
+    assert render_cache_module.EVICTION_TARGET == 0.9
+    assert len(scans) == 1
+    assert cache.total_size == 1000
+    assert [os.path.exists(cache.entry_path(key)) for key in keys] == [False] * 2 + [True] * 10
+
+
+def test_replacing_an_entry_keeps_the_size_total(tmp_path):
+    cache = RenderCache(str(tmp_path / "cache"), 1)
+    key = cache.key({"scene": 1}, "all", 0)
+    cache.store(key, write_render(tmp_path / "first.png", 100))
+    cache.store(key, write_render(tmp_path / "second.png", 40))
+    assert cache.total_size == 40
+    assert RenderCache(str(tmp_path / "cache"), 1).total_size == 40
+
+
+def test_jobs_with_equal_configs_share_keys(project, tmp_path):
+    configs = {
+        "render_configs": {"start_frame": 18, "end_frame": 18, "render_layers": {"all": "all"}, "samples": 512,
+                           "scheduler": {"cpu": 4}},
+        "dustjet_config": {"jets": 2},
+        "spacecraftAnimation_config": {"distance": 100},
+    }
+    paths = {
+        "cache_dir": "cache/",
+        "pipeline_version": "SetUp_",
+        "number_of_generation": "001",
+        "render_file": "cache/SetUp_001/SpacecraftMotion.blend",
+        "dataset_cache": str(tmp_path / "dataset") + "/",
+        "nucleus_config": str(tmp_path / "nucleus.json"),
+    }
+    for config, data in configs.items():
+        paths[config] = str(tmp_path / f"{config}.json")
+        with open(paths[config], 'w') as file:
+            json.dump(data, file)
+    target_data = {"cores": {"core": {"radius": 1.0}}}
+    with open(paths["nucleus_config"], 'w') as file:
+        json.dump(target_data, file)
+    module = project(paths, "src.utils.JsonParameterHandler")
+    updater = module.JsonParameterUpdater(paths["nucleus_config"], None, None, None)
+
+    cache = RenderCache(str(tmp_path / "cache" / "render_cache"), 1)
+    keys = []
+    for combination_index, radius in enumerate([2.0, 2.0, 3.0]):
+        job_env = updater.prepare_combination_job(combination_index, {"cores": {"core": {"radius": radius}}}, target_data)
+        with open(job_env["FLYBYGEN_PATHS"]) as file:
+            job_paths = json.load(file)
+        keys.append(cache.key(scene_configs(job_paths), "all", 18))
+    # The first two jobs have their own job directories and render files, but render the same scene
+    assert keys[0] == keys[1]
+    assert keys[0] != keys[2]
+
+
+def test_execution_settings_do_not_change_keys(tmp_path):
+    paths = {}
+    for config in ("nucleus_config", "dustjet_config", "spacecraftAnimation_config", "render_configs"):
+        paths[config] = str(tmp_path / f"{config}.json")
+        with open(paths[config], 'w') as file:
+            json.dump({"samples": 512}, file)
+    cache = RenderCache(str(tmp_path / "cache"), 1)
+    key = cache.key(scene_configs(paths), "all", 18)
+    with open(paths["render_configs"], 'w') as file:
+        json.dump({"samples": 512, "scheduler": {"cpu": 8}, "render_cache": {"enabled": True}, "start_frame": 3}, file)
+    assert cache.key(scene_configs(paths), "all", 18) == key
@@ -0,0 +1,72 @@
+import threading
+import time
+
+from src.utils.RenderScheduler import FakeProbe, RenderScheduler
+
+
+class FakeProcess:
+    """
+    Stands in for the subprocess of a render job and tracks how many jobs run at the same time.
+    """
+    lock = threading.Lock()
+    active = 0
+    max_active = 0
+
+    def __init__(self, returncode=0, duration=0.05):
+        self.returncode = returncode
+        self.duration = duration
+        with FakeProcess.lock:
+            FakeProcess.active += 1
+            FakeProcess.max_active = max(FakeProcess.max_active, FakeProcess.active)
+
+    def wait(self):
+        time.sleep(self.duration)
+        with FakeProcess.lock:
+            FakeProcess.active -= 1
+        return self.returncode
+
+    @classmethod
+    def reset(cls):
+        cls.active = 0
+        cls.max_active = 0
+
+
+def test_jobs_are_admitted_within_capacity_and_released():
+    FakeProcess.reset()
+    scheduler = RenderScheduler([FakeProbe({"cpu": 8, "ram_mb": 16000})], {"cpu": 4, "ram_mb": 2000, "gpu_mb": 6000},
+                                recheck_interval=0.01)
+    # The GPU is not probed, so it does not limit the jobs
+    assert scheduler.demand == {"cpu": 4, "ram_mb": 2000}
+    finished_jobs = scheduler.run(list(range(6)), lambda job: FakeProcess())
+    assert sorted(finished_jobs) == list(range(6))
+    assert FakeProcess.max_active == 2
+    assert scheduler.running == 0
+    assert scheduler.reserved == {"cpu": 0, "ram_mb": 0}
+
+
+def test_free_resources_and_job_limit_restrict_admission():
+    FakeProcess.reset()
+    # Other programs use most of the GPU memory, so only a single job fits at a time
+    scheduler = RenderScheduler([FakeProbe({"gpu_mb": 24000}, free={"gpu_mb": 5000})], {"gpu_mb": 6000},
+                                recheck_interval=0.01)
+    scheduler.run(list(range(3)), lambda job: FakeProcess())
+    assert FakeProcess.max_active == 1
+
+    FakeProcess.reset()
+    scheduler = RenderScheduler([FakeProbe({"cpu": 64})], {"cpu": 1}, max_jobs=3, recheck_interval=0.01)
+    scheduler.run(list(range(9)), lambda job: FakeProcess())
+    assert FakeProcess.max_active == 3
+
+
+def test_failed_jobs_release_their_resources():
+    FakeProcess.reset()
+
+    def launch(job):
+        if job == 1:
+            raise OSError("blender not found")
+        return FakeProcess(returncode=1 if job == 2 else 0)
+
+    scheduler = RenderScheduler([FakeProbe({"cpu": 4})], {"cpu": 4}, recheck_interval=0.01)
+    assert sorted(scheduler.run([0, 1, 2, 3], launch)) == [0, 3]
+    assert scheduler.running == 0
+    assert scheduler.reserved == {"cpu": 0}